@@ -3,8 +3,7 @@ from tools.memory import Memory
 from tools.logger import Logger
 from tools.trigger import Trigger
 from tools.message import Message
-import vertexai
-from vertexai.language_models import TextGenerationModel
+from tools.metrics import instrument
 
 class Agent:
     def __init__(self, name: str, memory: Memory, logger: Logger):
@@ -12,6 +11,9 @@ class Agent:
         self.memory = memory
         self.logger = logger
         self.triggers = []
+        # Imported here so that importing this module does not load the LLM SDK.
+        import vertexai
+        from vertexai.language_models import TextGenerationModel
         vertexai.init(project="gen-ai-app-408923", location="us-central1")
         self.parameters = {
             "candidate_count": 1,
@@ -36,6 +38,7 @@ class Agent:
             if trigger.event == event:
                 trigger.execute()
 
+    @instrument("agent.use_llm")
     def use_llm(self, prompt: str) -> str:
         response = self.model.predict(prompt, **self.parameters)
         return response.text
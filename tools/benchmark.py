@@ -0,0 +1,269 @@
+"""
+Benchmarks for the agent tools on synthetic repositories.
+
+Usage:
+    python -m tools.benchmark --sizes 100 1000 10000 --output results.json
+    python -m tools.benchmark --sizes 1000 --baseline results.json --threshold 1.25
+
+Each run writes a JSON report. When a baseline report is given, the run
+exits with status 1 if any case is slower than its baseline by more than
+the threshold factor.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from tools.memory import Memory
+from tools.trigger import Trigger
+
+DEFAULT_SIZES = [100, 1000]
+DEFAULT_THRESHOLD = 1.25
+
+WORDS = ["mood", "log", "user", "task", "reward", "avatar", "insight", "coach", "token", "community"]
+
+
+def generate_repository(root: str, file_count: int, ts_ratio: float = 0.3, functions_per_file: int = 5,
+                        files_per_dir: int = 100, seed: int = 0) -> Dict:
+    """
+    Writes a synthetic Python/TypeScript repository.
+
+    Files are spread over directories of files_per_dir files each. Every file
+    defines functions_per_file functions, a class, and calls a function from
+    an earlier file, so searches and symbol lookups have realistic hit rates.
+
+    Args:
+        root: The directory to create the repository in.
+        file_count: The number of source files to create.
+        ts_ratio: The fraction of files that are TypeScript rather than Python.
+        functions_per_file: The number of functions defined per file.
+        files_per_dir: The number of files per directory.
+        seed: The random seed, so the same arguments always produce the same tree.
+
+    Returns:
+        A dictionary describing the generated repository, including a sample of function names.
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    functions: List[str] = []
+    python_files: List[str] = []
+    for i in range(file_count):
+        directory = os.path.join(root, f"pkg{i // files_per_dir}")
+        if i % files_per_dir == 0:
+            os.makedirs(directory, exist_ok=True)
+        names = [f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{i}_{j}" for j in range(functions_per_file)]
+        callee = rng.choice(functions) if functions else names[0]
+        if rng.random() < ts_ratio:
+            path = os.path.join(directory, f"module{i}.ts")
+            lines = [f"import {{ helper }} from './helper';\n\n"]
+            for name in names:
+                lines.append(f"export function {name}(value: number): number {{\n    return {callee}(value) + {i};\n}}\n\n")
+            lines.append(f"export class Service{i} {{\n    run(): void {{\n        {names[0]}(1);\n    }}\n}}\n")
+        else:
+            path = os.path.join(directory, f"module{i}.py")
+            python_files.append(path)
+            lines = ["import os\n\n\n"]
+            for name in names:
+                lines.append(f"def {name}(value: int) -> int:\n    \"\"\"Computes {name}.\"\"\"\n    return {callee}(value) + {i}\n\n\n")
+            lines.append(f"class Service{i}:\n    def run(self):\n        return {names[0]}(1)\n")
+        with open(path, "w") as file:
+            file.writelines(lines)
+        functions.extend(names)
+    return {
+        "root": root,
+        "files": file_count,
+        "functions": len(functions),
+        "python_files": python_files,
+        "sample_functions": rng.sample(functions, min(10, len(functions))),
+    }
+
+
+def _time(func: Callable, repeat: int) -> Dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {"repeat": repeat, "min_s": min(timings), "mean_s": sum(timings) / len(timings), "max_s": max(timings)}
+
+
+def bench_find_code_usage(repo: Dict, repeat: int) -> Dict:
+    from tools.tools import find_code_usage
+    query = repo["sample_functions"][0]
+    return _time(lambda: find_code_usage(query), repeat)
+
+
+def bench_get_file_content_summary(repo: Dict, repeat: int) -> Dict:
+    from tools import tools
+    paths = [os.path.relpath(path) for path in repo["python_files"][:100]]
+
+    def run():
+        # Time cold summaries; otherwise every run after the first only measures cache hits.
+        tools._summary_cache.clear()
+        for path in paths:
+            tools.get_file_content_summary(path)
+    return _time(run, repeat)
+
+
+def bench_modify_code_structure(repo: Dict, repeat: int) -> Dict:
+    from tools import tools
+    if len(repo["python_files"]) < 2:
+        return {"skipped": "needs at least two Python files"}
+    from_path, to_path = (os.path.relpath(path) for path in repo["python_files"][:2])
+    with open(from_path, "r") as file:
+        func_name = file.read().split("def ", 1)[1].split("(", 1)[0]
+    prompt = f"move function {func_name} from {from_path} to {to_path}"
+
+    def run():
+        # The full approval round trip: request, approve, then resume the change.
+        pending = tools.modify_code_structure(from_path, prompt)
+        tools.receive_approval_response(pending["request_id"], True)
+        tools.modify_code_structure(from_path, prompt, request_id=pending["request_id"])
+        tools.discard_staged_changes()
+    # Keep the simulated UI's approval prompts out of the JSON report on stdout.
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _time(run, repeat)
+
+
+def bench_execute_trigger(repo: Dict, repeat: int) -> Dict:
+    trigger = Trigger()
+    calls = []
+    for i in range(repo["files"]):
+        trigger.create_trigger(f"trigger_{i}", f"Trigger {i}", f"event_{i % 10}")
+        trigger.add_action(f"trigger_{i}", calls.append)
+    return _time(lambda: [trigger.execute_trigger(f"event_{i}", {"index": i}) for i in range(10)], repeat)
+
+
+def bench_memory(repo: Dict, repeat: int) -> Dict:
+    keys = [f"key_{i}" for i in range(repo["files"] * 10)]
+
+    def run():
+        memory = Memory()
+        for key in keys:
+            memory.add_data(key, key)
+        for key in keys:
+            memory.get_data(key)
+        for key in keys:
+            memory.delete_data(key)
+    return _time(run, repeat)
+
+
+BENCHMARKS: Dict[str, Callable[[Dict, int], Dict]] = {
+    "find_code_usage": bench_find_code_usage,
+    "get_file_content_summary": bench_get_file_content_summary,
+    "modify_code_structure": bench_modify_code_structure,
+    "trigger.execute_trigger": bench_execute_trigger,
+    "memory": bench_memory,
+}
+
+
+def run_benchmarks(sizes: List[int], repeat: int = 3, cases: Optional[List[str]] = None, seed: int = 0) -> Dict:
+    """
+    Runs the benchmark cases against synthetic repositories of each size.
+
+    Args:
+        sizes: The repository sizes, in files.
+        repeat: The number of timed runs per case.
+        cases: The names of the cases to run. Runs all cases if None.
+        seed: The random seed for repository generation.
+
+    Returns:
+        A JSON-serializable report with one result per case and size. Repository
+        generation times are reported separately under "setup", so they are not
+        checked for regressions: they measure the test fixture, not the tools.
+    """
+    report = {
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "setup": {},
+        "results": {},
+    }
+    cwd = os.getcwd()
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix=f"tools_bench_{size}_")
+        try:
+            start = time.perf_counter()
+            repo = generate_repository(root, size, seed=seed)
+            report["setup"][f"generate_repository/{size}"] = {"seconds": time.perf_counter() - start}
+            os.chdir(root)
+            for name in cases or BENCHMARKS:
+                try:
+                    result = BENCHMARKS[name](repo, repeat)
+                except Exception as e:
+                    result = {"error": f"{type(e).__name__}: {e}"}
+                report["results"][f"{name}/{size}"] = result
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(root)
+    return report
+
+
+def compare(report: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """
+    Compares a report with a baseline report.
+
+    Args:
+        report: The current report.
+        baseline: The report to compare against.
+        threshold: The largest allowed ratio of current to baseline minimum time.
+
+    Returns:
+        One entry per regressed or failed case; empty if the run is within the threshold.
+    """
+    failures = []
+    for case, result in report["results"].items():
+        if "error" in result:
+            failures.append({"case": case, "error": result["error"]})
+            continue
+        previous = baseline.get("results", {}).get(case)
+        if not previous or "min_s" not in previous or "min_s" not in result:
+            continue
+        ratio = result["min_s"] / previous["min_s"] if previous["min_s"] else 1.0
+        if ratio > threshold:
+            failures.append({"case": case, "ratio": ratio, "min_s": result["min_s"], "baseline_min_s": previous["min_s"]})
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the agent tools on synthetic repositories.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="repository sizes in files (100 to 100000)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case")
+    parser.add_argument("--cases", nargs="+", choices=sorted(BENCHMARKS), help="cases to run (default: all)")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="a previous JSON report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fail if a case is slower than the baseline by more than this factor")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.repeat, args.cases)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+    failures = compare(report, baseline or {}, args.threshold)
+    report["failures"] = failures
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+    for failure in failures:
+        reason = failure.get("error") or f"{failure['ratio']:.2f}x slower than baseline"
+        print(f"FAILED {failure['case']}: {reason}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
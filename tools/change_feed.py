@@ -0,0 +1,501 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+CREATED = "created"
+MODIFIED = "modified"
+DELETED = "deleted"
+
+DEFAULT_IGNORE_DIRS = {".git", "node_modules", "__pycache__", ".next", ".venv", "venv"}
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+RawEvents = List[Tuple[str, str]]
+
+
+def _walk_files(root: str, ignore_dirs: Set[str]) -> Iterable[os.DirEntry]:
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in ignore_dirs:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+
+
+class PollingWatcher:
+    """
+    Detects changes by periodically re-stating every file under a root.
+
+    The tree is scanned at most once per interval, however often
+    read_events() is called; calls between scans only wait.
+    """
+
+    def __init__(self, root: str, extensions: Optional[Tuple[str, ...]] = None,
+                 ignore_dirs: Set[str] = DEFAULT_IGNORE_DIRS, interval: float = 1.0):
+        self.root = root
+        self.extensions = extensions
+        self.ignore_dirs = ignore_dirs
+        self.interval = interval
+        self.state = self.snapshot()
+        self.last_scan = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Tuple[int, int]]:
+        state = {}
+        for entry in _walk_files(self.root, self.ignore_dirs):
+            if self.extensions and not entry.name.endswith(self.extensions):
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            state[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def read_events(self, timeout: float) -> RawEvents:
+        wait = self.last_scan + self.interval - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        if wait > 0:
+            time.sleep(wait)
+        current = self.snapshot()
+        self.last_scan = time.monotonic()
+        events = []
+        for path, signature in current.items():
+            previous = self.state.get(path)
+            if previous is None:
+                events.append((path, CREATED))
+            elif previous != signature:
+                events.append((path, MODIFIED))
+        for path in self.state.keys() - current.keys():
+            events.append((path, DELETED))
+        self.state = current
+        return events
+
+    def close(self) -> None:
+        self.state = {}
+
+
+class InotifyWatcher:
+    """Receives change notifications from the Linux kernel via inotify."""
+
+    def __init__(self, root: str, extensions: Optional[Tuple[str, ...]] = None,
+                 ignore_dirs: Set[str] = DEFAULT_IGNORE_DIRS):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux.")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.root = root
+        self.extensions = extensions
+        self.ignore_dirs = ignore_dirs
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: Dict[int, str] = {}
+        try:
+            self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory: str) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch failed for {directory}: {os.strerror(errno)}")
+        self.watches[wd] = directory
+
+    def _watch_tree(self, root: str, events: Optional[RawEvents] = None) -> None:
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                self._add_watch(directory)
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in self.ignore_dirs:
+                                stack.append(entry.path)
+                        elif events is not None and self._wanted(entry.name):
+                            events.append((entry.path, CREATED))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+    def _wanted(self, name: str) -> bool:
+        return not self.extensions or name.endswith(self.extensions)
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def read_events(self, timeout: float) -> RawEvents:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events: RawEvents = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                raise OverflowError("inotify event queue overflowed.")
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or mask & IN_DELETE_SELF:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if name in self.ignore_dirs:
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path, events)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    events.append((path, DELETED))
+                continue
+            if not self._wanted(name):
+                continue
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                events.append((path, CREATED))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                events.append((path, DELETED))
+            elif mask & (IN_MODIFY | IN_CLOSE_WRITE):
+                events.append((path, MODIFIED))
+        return events
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.watches = {}
+
+
+def _merge(previous: Optional[str], current: str) -> Optional[str]:
+    """Coalesces two events on the same path into the net change, or None if they cancel out."""
+    if previous is None:
+        return current
+    if previous == CREATED:
+        return None if current == DELETED else CREATED
+    if previous == DELETED:
+        return MODIFIED if current == CREATED else current
+    return DELETED if current == DELETED else MODIFIED
+
+
+class ChangeFeed:
+    """
+    Publishes debounced batches of file changes under a directory tree.
+
+    Uses inotify on Linux and falls back to stat polling elsewhere, or when
+    inotify cannot be set up (for example when the watch limit is reached).
+    Subscribers are called with a dictionary of the form
+    {"created": [...], "modified": [...], "deleted": [...], "rescan": bool}.
+    "rescan" is True when events may have been lost and consumers should
+    invalidate everything they derived from the tree. Deleted paths can be
+    directories, in which case everything beneath them is gone too.
+
+    A batch is published once changes have been quiet for `debounce` seconds,
+    or after `max_delay` seconds if they never go quiet, so a file that is
+    written continuously cannot hold back every other change.
+    """
+
+    def __init__(self, root: str = ".", debounce: float = 0.2, poll_interval: float = 1.0,
+                 use_inotify: Optional[bool] = None, extensions: Optional[Tuple[str, ...]] = None,
+                 ignore_dirs: Set[str] = DEFAULT_IGNORE_DIRS, max_delay: float = 2.0):
+        self.root = root
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.extensions = extensions
+        self.ignore_dirs = ignore_dirs
+        self.subscribers: List[Callable[[Dict], None]] = []
+        self.pending: Dict[str, str] = {}
+        self.rescan = False
+        self.watcher = None
+        if use_inotify is not False:
+            try:
+                self.watcher = InotifyWatcher(root, extensions, ignore_dirs)
+            except (OSError, AttributeError) as e:
+                if use_inotify:
+                    raise
+                logging.warning(f"inotify unavailable, falling back to stat polling: {e}")
+        if self.watcher is None:
+            self.watcher = PollingWatcher(root, extensions, ignore_dirs, poll_interval)
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def backend(self) -> str:
+        return "inotify" if isinstance(self.watcher, InotifyWatcher) else "polling"
+
+    def subscribe(self, callback: Callable[[Dict], None]) -> None:
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Dict], None]) -> None:
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def _collect(self, timeout: float) -> bool:
+        try:
+            events = self.watcher.read_events(timeout)
+        except OverflowError as e:
+            logging.error(f"Change feed lost events, requesting rescan: {e}")
+            self.rescan = True
+            return True
+        except OSError as e:
+            # Typically ENOSPC from inotify_add_watch when a new directory exceeds the watch limit.
+            logging.error(f"Change feed watcher failed, falling back to stat polling and requesting rescan: {e}")
+            self.watcher.close()
+            self.watcher = PollingWatcher(self.root, self.extensions, self.ignore_dirs, self.poll_interval)
+            self.rescan = True
+            return True
+        for path, kind in events:
+            merged = _merge(self.pending.get(path), kind)
+            if merged is None:
+                self.pending.pop(path, None)
+            else:
+                self.pending[path] = merged
+        return bool(events)
+
+    def _publish(self) -> Optional[Dict]:
+        if not self.pending and not self.rescan:
+            return None
+        batch = {CREATED: [], MODIFIED: [], DELETED: [], "rescan": self.rescan}
+        for path in sorted(self.pending):
+            batch[self.pending[path]].append(path)
+        self.pending = {}
+        self.rescan = False
+        for callback in list(self.subscribers):
+            try:
+                callback(batch)
+            except Exception as e:
+                logging.error(f"Change feed subscriber failed: {e}")
+        return batch
+
+    def poll(self, timeout: float = 1.0) -> Optional[Dict]:
+        """
+        Waits for changes and publishes them as one batch once they go quiet,
+        or once the first of them is max_delay seconds old.
+
+        Args:
+            timeout: How long to wait for the first change, in seconds.
+
+        Returns:
+            The published batch, or None if nothing changed within the timeout.
+        """
+        if not self._collect(timeout):
+            return self._publish()
+        deadline = time.monotonic() + self.max_delay
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._collect(min(self.debounce, remaining)):
+                break
+        return self._publish()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.poll(self.debounce)
+
+    def start(self) -> None:
+        """Starts publishing batches from a background thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.watcher.close()
+
+
+def benchmark(file_count: int = 50000, files_per_dir: int = 100) -> Dict:
+    """
+    Compares the cost of stat polling and inotify on a synthetic tree.
+
+    Args:
+        file_count: The number of files to create.
+        files_per_dir: The number of files per directory.
+
+    Returns:
+        A dictionary of timings in seconds.
+    """
+    root = tempfile.mkdtemp(prefix="change_feed_bench_")
+    try:
+        for i in range(file_count):
+            directory = os.path.join(root, f"pkg{i // files_per_dir}")
+            if i % files_per_dir == 0:
+                os.makedirs(directory)
+            with open(os.path.join(directory, f"module{i}.py"), "w") as file:
+                file.write(f"def function_{i}():\n    return {i}\n")
+        results = {"files": file_count, "directories": -(-file_count // files_per_dir)}
+
+        start = time.perf_counter()
+        poller = PollingWatcher(root, interval=0)
+        results["polling_setup"] = time.perf_counter() - start
+        start = time.perf_counter()
+        poller.read_events(0)
+        results["polling_scan"] = time.perf_counter() - start
+
+        try:
+            start = time.perf_counter()
+            notifier = InotifyWatcher(root)
+            results["inotify_setup"] = time.perf_counter() - start
+            start = time.perf_counter()
+            notifier.read_events(0)
+            results["inotify_idle_poll"] = time.perf_counter() - start
+            with open(os.path.join(root, "pkg0", "module0.py"), "a") as file:
+                file.write("# touched\n")
+            start = time.perf_counter()
+            notifier.read_events(1.0)
+            results["inotify_change_poll"] = time.perf_counter() - start
+            notifier.close()
+        except OSError as e:
+            results["inotify_error"] = str(e)
+        return results
+    finally:
+        shutil.rmtree(root)
+
+
+class _ScriptedWatcher:
+    def __init__(self, reads: List):
+        self.reads = reads
+        self.closed = False
+
+    def read_events(self, timeout: float) -> RawEvents:
+        if not self.reads:
+            return []
+        read = self.reads.pop(0)
+        if isinstance(read, Exception):
+            raise read
+        return read
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class TestChangeFeed(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "module.py")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_merge(self):
+        self.assertEqual(_merge(None, MODIFIED), MODIFIED)
+        self.assertEqual(_merge(CREATED, MODIFIED), CREATED)
+        self.assertIsNone(_merge(CREATED, DELETED))
+        self.assertEqual(_merge(DELETED, CREATED), MODIFIED)
+        self.assertEqual(_merge(MODIFIED, DELETED), DELETED)
+
+    def test_debounce(self):
+        feed = ChangeFeed(self.root, use_inotify=False)
+        feed.watcher = _ScriptedWatcher([
+            [("a.py", CREATED)],
+            [("a.py", MODIFIED), ("b.py", CREATED)],
+            [("b.py", DELETED), ("c.py", MODIFIED)],
+        ])
+        batches = []
+        feed.subscribe(batches.append)
+        self.assertEqual(feed.poll(0), {CREATED: ["a.py"], MODIFIED: ["c.py"], DELETED: [], "rescan": False})
+        self.assertIsNone(feed.poll(0))
+        self.assertEqual(len(batches), 1)
+
+    def test_max_delay(self):
+        feed = ChangeFeed(self.root, use_inotify=False, max_delay=0)
+        # A file that never stops changing still lets the batch through.
+        feed.watcher = _ScriptedWatcher([[("busy.py", MODIFIED)]] * 100)
+        self.assertEqual(feed.poll(0)[MODIFIED], ["busy.py"])
+        self.assertTrue(feed.watcher.reads)
+
+    def test_watcher_failure_falls_back_to_polling(self):
+        feed = ChangeFeed(self.root, use_inotify=False)
+        scripted = feed.watcher = _ScriptedWatcher([OSError(28, "inotify_add_watch failed")])
+        self.assertTrue(feed.poll(0)["rescan"])
+        self.assertTrue(scripted.closed)
+        self.assertEqual(feed.backend, "polling")
+
+    def test_polling_backend(self):
+        feed = ChangeFeed(self.root, debounce=0.01, poll_interval=0.05, use_inotify=False)
+        with open(self.path, "w") as f:
+            f.write("a = 1\n")
+        self.assertEqual(feed.poll(1.0)[CREATED], [self.path])
+        with open(self.path, "a") as f:
+            f.write("b = 2\n")
+        self.assertEqual(feed.poll(1.0)[MODIFIED], [self.path])
+        os.unlink(self.path)
+        self.assertEqual(feed.poll(1.0)[DELETED], [self.path])
+        feed.stop()
+
+    def test_polling_interval(self):
+        watcher = PollingWatcher(self.root, interval=60)
+        with open(self.path, "w") as f:
+            f.write("a = 1\n")
+        self.assertEqual(watcher.read_events(0.01), [])
+        watcher.last_scan -= 60
+        self.assertEqual(watcher.read_events(0.01), [(self.path, CREATED)])
+
+    def test_inotify_backend(self):
+        try:
+            feed = ChangeFeed(self.root, debounce=0.05, use_inotify=True)
+        except (OSError, AttributeError) as e:
+            self.skipTest(f"inotify unavailable: {e}")
+        try:
+            os.makedirs(os.path.join(self.root, "pkg"))
+            nested = os.path.join(self.root, "pkg", "nested.py")
+            with open(nested, "w") as f:
+                f.write("a = 1\n")
+            with open(self.path, "w") as f:
+                f.write("a = 1\n")
+            batch = feed.poll(1.0)
+            self.assertEqual(batch[CREATED], sorted([nested, self.path]))
+            os.unlink(self.path)
+            self.assertEqual(feed.poll(1.0)[DELETED], [self.path])
+        finally:
+            feed.stop()
+
+
+if __name__ == '__main__':
+    import json
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    print(json.dumps(benchmark(count), indent=2))
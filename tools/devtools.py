@@ -1,3 +1,6 @@
+from typing import Optional
+from tools.dom_snapshot import DomSnapshot
+
 def get_console_logs() -> dict:
     """
     Simulates retrieving console log entries from a running application.
@@ -56,6 +59,41 @@ def get_dom_structure() -> dict:
     }
     return {"dom_structure": simulated_dom}
 
+def get_dom_snapshot(path: Optional[str] = None) -> DomSnapshot:
+    """
+    Captures an indexed DOM snapshot.
+
+    Args:
+        path: An optional JSON file holding a saved DOM tree, standing in for a live browser.
+              If None, the simulated DOM structure is used.
+
+    Returns:
+        DomSnapshot: The indexed snapshot.
+    """
+    if path is not None:
+        return DomSnapshot.from_json_file(path)
+    return DomSnapshot.from_tree(get_dom_structure()["dom_structure"])
+
+def run_terminal_command(command: str) -> str:
+    """
+    Simulates running a terminal command.
+
+    Args:
+        command: The command line to run.
+
+    Returns:
+        str: The simulated output of the command.
+    """
+    if command.startswith("ls"):
+        return "file1.txt directory1"
+    if command.startswith("pwd"):
+        return "/app"
+    if command.startswith("git status"):
+        return "On branch main\nnothing to commit, working tree clean"
+    if command.startswith("echo"):
+        return command[5:]
+    return f"Simulated output of '{command}'"
+
 if __name__ == '__main__':
     # Example usage:
     logs = get_console_logs()
@@ -0,0 +1,252 @@
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+# One compound selector: an optional tag (or *) followed by any number of #id and .class parts.
+COMPOUND_SELECTOR = re.compile(r"^(?P<tag>\*|[A-Za-z][\w-]*)?(?P<rest>(?:[#.][\w-]+)*)$")
+SELECTOR_PART = re.compile(r"([#.])([\w-]+)")
+
+
+def _parse_compound(text: str) -> Tuple[Optional[str], Optional[str], Tuple[str, ...]]:
+    match = COMPOUND_SELECTOR.match(text)
+    if not match or not text:
+        raise ValueError(f"Unsupported selector: {text!r}")
+    tag = match.group("tag")
+    node_id = None
+    classes = []
+    for kind, value in SELECTOR_PART.findall(match.group("rest")):
+        if kind == "#":
+            node_id = value
+        else:
+            classes.append(value)
+    return (None if tag in (None, "*") else tag.lower()), node_id, tuple(classes)
+
+
+def parse_selector(selector: str) -> List[List[Tuple[str, Tuple]]]:
+    """
+    Parses a comma-separated list of simple CSS selectors.
+
+    Supported: tag, #id, .class, *, compounds such as div#app.main, and the
+    descendant (space) and child (>) combinators.
+
+    Args:
+        selector: The selector text.
+
+    Returns:
+        One list per comma-separated group of (combinator, compound) pairs, right-most compound last.
+    """
+    groups = []
+    for group in selector.split(","):
+        tokens = re.sub(r"\s*>\s*", " > ", group.strip()).split()
+        if not tokens:
+            raise ValueError(f"Unsupported selector: {selector!r}")
+        steps = []
+        combinator = " "
+        for token in tokens:
+            if token == ">":
+                if not steps or combinator == ">":
+                    raise ValueError(f"Unsupported selector: {selector!r}")
+                combinator = ">"
+                continue
+            steps.append((combinator, _parse_compound(token)))
+            combinator = " "
+        if combinator == ">":
+            raise ValueError(f"Unsupported selector: {selector!r}")
+        groups.append(steps)
+    return groups
+
+
+class DomSnapshot:
+    """
+    A compact, indexed snapshot of a DOM tree.
+
+    Nodes are stored in flat parallel arrays in document (pre-)order and
+    referred to by their position. Indexes by id, class and tag let simple
+    selectors start from a small candidate set instead of walking the tree;
+    combinators are then checked by following parent links upward.
+    """
+
+    def __init__(self):
+        self.tags: List[str] = []
+        self.ids: List[Optional[str]] = []
+        self.classes: List[Tuple[str, ...]] = []
+        self.attributes: List[Dict] = []
+        self.texts: List[Optional[str]] = []
+        self.parents: List[int] = []
+        self.paths: List[str] = []
+        self.by_id: Dict[str, List[int]] = {}
+        self.by_class: Dict[str, List[int]] = {}
+        self.by_tag: Dict[str, List[int]] = {}
+
+    @classmethod
+    def from_tree(cls, root: Dict) -> "DomSnapshot":
+        """
+        Builds a snapshot from the nested dictionary format returned by devtools.get_dom_structure.
+
+        Args:
+            root: The root node, with "tag" and optional "id", "classes", "attributes", "text" and "children".
+
+        Returns:
+            The snapshot.
+        """
+        snapshot = cls()
+        stack = [(root, -1, f"/{root.get('tag', '').lower()}")]
+        while stack:
+            node, parent, path = stack.pop()
+            index = len(snapshot.tags)
+            tag = node.get("tag", "").lower()
+            node_id = node.get("id")
+            classes = tuple(node.get("classes", ()))
+            snapshot.tags.append(tag)
+            snapshot.ids.append(node_id)
+            snapshot.classes.append(classes)
+            snapshot.attributes.append(dict(node.get("attributes", {})))
+            snapshot.texts.append(node.get("text"))
+            snapshot.parents.append(parent)
+            snapshot.paths.append(path)
+            snapshot.by_tag.setdefault(tag, []).append(index)
+            if node_id:
+                snapshot.by_id.setdefault(node_id, []).append(index)
+            for class_name in classes:
+                snapshot.by_class.setdefault(class_name, []).append(index)
+
+            # Children are keyed by id when they have one, otherwise by their position among same-tag siblings,
+            # so inserting an unrelated sibling does not make every later node look changed in a diff.
+            # Ids are not guaranteed unique, so a repeated id also gets its occurrence number.
+            children = node.get("children", [])
+            positions: Dict[str, int] = {}
+            keyed = []
+            for child in children:
+                child_tag = child.get("tag", "").lower()
+                if child.get("id"):
+                    key = f"{child_tag}#{child['id']}"
+                    occurrence = positions.get(key, 0)
+                    positions[key] = occurrence + 1
+                    if occurrence:
+                        key = f"{key}[{occurrence}]"
+                else:
+                    position = positions.get(child_tag, 0)
+                    positions[child_tag] = position + 1
+                    key = f"{child_tag}[{position}]"
+                keyed.append((child, index, f"{path}/{key}"))
+            stack.extend(reversed(keyed))
+        return snapshot
+
+    @classmethod
+    def from_json_file(cls, path: str) -> "DomSnapshot":
+        """
+        Loads a snapshot from a JSON file holding a DOM tree, either bare or under a "dom_structure" key.
+
+        Args:
+            path: The path to the JSON file.
+
+        Returns:
+            The snapshot.
+        """
+        with open(path, "r") as file:
+            data = json.load(file)
+        return cls.from_tree(data.get("dom_structure", data))
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def node(self, index: int) -> Dict:
+        """Returns a node as a flat dictionary, without its children."""
+        node = {"index": index, "path": self.paths[index], "tag": self.tags[index]}
+        if self.ids[index]:
+            node["id"] = self.ids[index]
+        if self.classes[index]:
+            node["classes"] = list(self.classes[index])
+        if self.attributes[index]:
+            node["attributes"] = self.attributes[index]
+        if self.texts[index] is not None:
+            node["text"] = self.texts[index]
+        return node
+
+    def _matches(self, index: int, compound: Tuple) -> bool:
+        tag, node_id, classes = compound
+        if tag is not None and self.tags[index] != tag:
+            return False
+        if node_id is not None and self.ids[index] != node_id:
+            return False
+        return all(class_name in self.classes[index] for class_name in classes)
+
+    def _candidates(self, compound: Tuple) -> List[int]:
+        tag, node_id, classes = compound
+        options = []
+        if node_id is not None:
+            options.append(self.by_id.get(node_id, []))
+        for class_name in classes:
+            options.append(self.by_class.get(class_name, []))
+        if tag is not None:
+            options.append(self.by_tag.get(tag, []))
+        if not options:
+            return list(range(len(self.tags)))
+        return min(options, key=len)
+
+    def _matches_ancestors(self, index: int, steps: List) -> bool:
+        # steps are the remaining (combinator, compound) pairs, right-most first
+        if not steps:
+            return True
+        combinator, compound = steps[0]
+        parent = self.parents[index]
+        while parent != -1:
+            if self._matches(parent, compound) and self._matches_ancestors(parent, steps[1:]):
+                return True
+            if combinator == ">":
+                return False
+            parent = self.parents[parent]
+        return False
+
+    def select(self, selector: str) -> List[int]:
+        """
+        Finds the nodes matching a simple CSS selector.
+
+        Args:
+            selector: The selector, e.g. "#app-container", "div.main > header" or "main p, footer".
+
+        Returns:
+            The matching node indexes in document order.
+        """
+        matches = set()
+        for steps in parse_selector(selector):
+            target = steps[-1][1]
+            # Pair each ancestor compound with the combinator linking it to the step on its right, right-most first.
+            chain = [(steps[i + 1][0], steps[i][1]) for i in range(len(steps) - 2, -1, -1)]
+            for index in self._candidates(target):
+                if self._matches(index, target) and self._matches_ancestors(index, chain):
+                    matches.add(index)
+        return sorted(matches)
+
+    def query(self, selector: str) -> List[Dict]:
+        """Like select(), but returns the matching nodes as dictionaries."""
+        return [self.node(index) for index in self.select(selector)]
+
+    def diff(self, newer: "DomSnapshot") -> Dict:
+        """
+        Computes the structural difference between this snapshot and a newer one.
+
+        Nodes are matched by path, which uses the id where a node has one
+        (numbered when siblings repeat it) and the position among same-tag
+        siblings otherwise.
+
+        Args:
+            newer: The later snapshot.
+
+        Returns:
+            A dictionary with "added" and "removed" nodes and "changed" node pairs.
+        """
+        old_paths = {path: index for index, path in enumerate(self.paths)}
+        new_paths = {path: index for index, path in enumerate(newer.paths)}
+        added = [newer.node(index) for path, index in new_paths.items() if path not in old_paths]
+        removed = [self.node(index) for path, index in old_paths.items() if path not in new_paths]
+        changed = []
+        for path, new_index in new_paths.items():
+            old_index = old_paths.get(path)
+            if old_index is None:
+                continue
+            before, after = self.node(old_index), newer.node(new_index)
+            del before["index"], before["path"], after["index"], after["path"]
+            if before != after:
+                changed.append({"path": path, "before": before, "after": after})
+        return {"added": added, "removed": removed, "changed": changed}
@@ -0,0 +1,166 @@
+import mmap
+import os
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterator, Optional, Tuple
+from tools.metrics import record_bytes_read
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class LineIndex:
+    """Byte offsets of the start of every line in a file.
+
+    The index remembers the file's size and modification time so a cached
+    copy can be discarded as soon as the file changes on disk.
+    """
+
+    def __init__(self, path: str, size: int, mtime_ns: int, offsets: array):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.offsets = offsets
+
+    @property
+    def line_count(self) -> int:
+        return len(self.offsets)
+
+    def is_current(self, stat: os.stat_result) -> bool:
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def byte_range(self, start_line: int, end_line: int) -> Tuple[int, int]:
+        """
+        Converts a 1-based inclusive line range into a byte range.
+
+        Args:
+            start_line: The first line to include (1-based).
+            end_line: The last line to include (1-based, inclusive).
+
+        Returns:
+            A (start, end) tuple of byte offsets suitable for slicing.
+        """
+        start_line = max(1, start_line)
+        end_line = min(self.line_count, end_line)
+        if start_line > end_line:
+            return 0, 0
+        start = self.offsets[start_line - 1]
+        end = self.offsets[end_line] if end_line < self.line_count else self.size
+        return start, end
+
+    def line_at(self, byte_offset: int) -> int:
+        """Returns the 1-based line number containing the given byte offset."""
+        return bisect_right(self.offsets, byte_offset)
+
+
+# Line indexes keyed by absolute path; entries are validated against os.stat on each use.
+_line_index_cache: Dict[str, LineIndex] = {}
+
+
+def _build_line_index(path: str, stat: os.stat_result) -> LineIndex:
+    offsets = array("Q")
+    if stat.st_size == 0:
+        return LineIndex(path, 0, stat.st_mtime_ns, offsets)
+    offsets.append(0)
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        position = mm.find(b"\n")
+        while position != -1:
+            if position + 1 < stat.st_size:
+                offsets.append(position + 1)
+            position = mm.find(b"\n", position + 1)
+    return LineIndex(path, stat.st_size, stat.st_mtime_ns, offsets)
+
+
+def get_line_index(path: str) -> LineIndex:
+    """
+    Returns the line index for a file, rebuilding it only if the file changed.
+
+    Args:
+        path: The path to the file.
+
+    Returns:
+        The cached or freshly built LineIndex.
+    """
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    index = _line_index_cache.get(key)
+    if index is None or not index.is_current(stat):
+        index = _build_line_index(key, stat)
+        _line_index_cache[key] = index
+    return index
+
+
+def clear_line_index_cache(path: Optional[str] = None) -> None:
+    """Drops the cached line index for one file, or for all files if no path is given."""
+    if path is None:
+        _line_index_cache.clear()
+    else:
+        _line_index_cache.pop(os.path.abspath(path), None)
+
+
+def read_bytes(path: str, start: int = 0, end: Optional[int] = None) -> bytes:
+    """
+    Reads a byte range from a file through a read-only memory map.
+
+    Args:
+        path: The path to the file.
+        start: The first byte offset to read.
+        end: The byte offset to stop at (exclusive). Reads to the end of the file if None.
+
+    Returns:
+        The requested bytes.
+    """
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        end = size if end is None else min(end, size)
+        start = max(0, start)
+        if size == 0 or start >= end:
+            return b""
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            record_bytes_read(end - start)
+            return mm[start:end]
+
+
+def read_lines(path: str, start_line: int, end_line: Optional[int] = None, encoding: str = "utf-8") -> str:
+    """
+    Reads a range of lines from a file without loading the rest of it.
+
+    Args:
+        path: The path to the file.
+        start_line: The first line to read (1-based).
+        end_line: The last line to read (1-based, inclusive). Reads to the end of the file if None.
+        encoding: The text encoding of the file.
+
+    Returns:
+        The requested lines, including their line endings.
+    """
+    index = get_line_index(path)
+    if end_line is None:
+        end_line = index.line_count
+    start, end = index.byte_range(start_line, end_line)
+    return read_bytes(path, start, end).decode(encoding)
+
+
+def iter_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Streams a file in fixed-size chunks.
+
+    The underlying file handle is closed when the iterator is exhausted or
+    when it is closed explicitly (for example via contextlib.closing), so
+    abandoning a stream part way through does not leak a descriptor.
+
+    Args:
+        path: The path to the file.
+        chunk_size: The maximum number of bytes per chunk.
+
+    Yields:
+        Successive chunks of the file.
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer.")
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            record_bytes_read(len(chunk))
+            yield chunk
@@ -6,4 +6,8 @@ class Logger:
         self.messages.append(message)
 
     def get_all_messages(self):
-        return self.messages
\ No newline at end of file
+        return self.messages
+
+
+# A shared logger for callers that do not manage their own.
+logger = Logger()
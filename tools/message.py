@@ -28,4 +28,14 @@ def create_observation_message(sender: str, receiver: str, content: dict) -> Mes
 
 
 def create_alert_message(sender: str, receiver: str, content: dict) -> Message:
-    return Message(sender, receiver, ALERT, content)
\ No newline at end of file
+    return Message(sender, receiver, ALERT, content)
+
+class MessageType:
+    REQUEST_INFORMATION = REQUEST_INFORMATION
+    SUGGESTION = SUGGESTION
+    OBSERVATION = OBSERVATION
+    ALERT = ALERT
+
+
+def create_message(sender: str, receiver: str, type: str, content: dict) -> Message:
+    return Message(sender, receiver, type, content)
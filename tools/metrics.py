@@ -0,0 +1,194 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# Upper bounds of the latency histogram buckets, in milliseconds. The last bucket catches everything slower.
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000, 30000)
+
+
+class MetricStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes_read = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, seconds: float, error: bool) -> None:
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        milliseconds = seconds * 1000
+        for bucket, bound in enumerate(LATENCY_BUCKETS_MS):
+            if milliseconds <= bound:
+                self.histogram[bucket] += 1
+                return
+        self.histogram[-1] += 1
+
+    def to_dict(self) -> Dict:
+        histogram = {f"le_{bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self.histogram)}
+        histogram["inf"] = self.histogram[-1]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": self.total_seconds * 1000,
+            "mean_ms": self.total_seconds * 1000 / self.calls if self.calls else 0.0,
+            "max_ms": self.max_seconds * 1000,
+            "bytes_read": self.bytes_read,
+            "latency_histogram": histogram,
+        }
+
+
+def _is_error_result(result) -> bool:
+    return isinstance(result, dict) and "error" in result
+
+
+class MetricsRegistry:
+    """
+    Collects call counts, latency histograms and bytes read for instrumented code.
+
+    When disabled, an instrumented function costs one attribute check on top
+    of the call itself and nothing is recorded. Bytes read are attributed to
+    the innermost instrumented call running on the current thread.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stats: Dict[str, MetricStats] = {}
+        self.tools: Dict[str, Callable] = {}
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats = {}
+            self.bytes_read = 0
+
+    def _active(self) -> List[str]:
+        active = getattr(self._local, "active", None)
+        if active is None:
+            active = self._local.active = []
+        return active
+
+    def _stats(self, name: str) -> MetricStats:
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = MetricStats()
+        return stats
+
+    def _observe(self, name: str, seconds: float, error: bool) -> None:
+        with self._lock:
+            self._stats(name).observe(seconds, error)
+
+    def observe(self, name: str, seconds: float, error: bool = False) -> None:
+        """Records a duration measured elsewhere, such as a wait that spans several calls."""
+        if self.enabled:
+            self._observe(name, seconds, error)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        Times the enclosed block under the given metric name.
+
+        Yields a dictionary whose "error" entry the block can set to record a
+        failure that did not raise. Exceptions are always counted as errors.
+        """
+        outcome = {"error": False}
+        if not self.enabled:
+            yield outcome
+            return
+        active = self._active()
+        active.append(name)
+        start = time.perf_counter()
+        try:
+            yield outcome
+        except BaseException:
+            outcome["error"] = True
+            raise
+        finally:
+            active.pop()
+            self._observe(name, time.perf_counter() - start, outcome["error"])
+
+    def instrument(self, name: Optional[str] = None, failed: Optional[Callable[[object], bool]] = None) -> Callable:
+        """
+        Decorates a function so that its calls are counted and timed.
+
+        Args:
+            name: The metric name. Defaults to the function's qualified name.
+            failed: An optional check on the return value; calls for which it returns True count as errors.
+        """
+        def decorator(func: Callable) -> Callable:
+            metric = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.timer(metric) as outcome:
+                    result = func(*args, **kwargs)
+                    if failed is not None:
+                        outcome["error"] = failed(result)
+                    return result
+
+            wrapper.metric_name = metric
+            return wrapper
+        return decorator
+
+    def instrument_tool(self, func: Callable) -> Callable:
+        """
+        Instruments an agent-facing tool function and registers it by name.
+
+        Tools report most failures by returning a dictionary with an "error"
+        key instead of raising, so those calls are counted as errors too.
+        """
+        wrapper = self.instrument(f"tool.{func.__name__}", failed=_is_error_result)(func)
+        self.tools[func.__name__] = wrapper
+        return wrapper
+
+    def record_bytes_read(self, count: int) -> None:
+        """Adds to the bytes read by the innermost instrumented call on this thread."""
+        if not self.enabled:
+            return
+        active = self._active()
+        with self._lock:
+            self.bytes_read += count
+            if active:
+                self._stats(active[-1]).bytes_read += count
+
+    def snapshot(self) -> Dict:
+        """Returns all collected metrics as a JSON-serializable dictionary."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "timestamp": time.time(),
+                "bytes_read": self.bytes_read,
+                "metrics": {name: stats.to_dict() for name, stats in sorted(self.stats.items())},
+            }
+
+    def export_json(self, path: str) -> None:
+        """Writes a snapshot of all collected metrics to a JSON file."""
+        with open(path, "w") as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+
+# Process-wide registry. Set NEUROSYNC_METRICS=1 to collect from startup, or call registry.enable().
+registry = MetricsRegistry(enabled=os.environ.get("NEUROSYNC_METRICS") == "1")
+instrument = registry.instrument
+instrument_tool = registry.instrument_tool
+timed = registry.timer
+observe = registry.observe
+record_bytes_read = registry.record_bytes_read
@@ -0,0 +1,152 @@
+import os
+import uuid
+from typing import Dict, List, Optional
+from tools.metrics import record_bytes_read
+
+
+class StagingOverlay:
+    """
+    An in-memory copy-on-write layer over the filesystem.
+
+    Writes are held as per-file buffers instead of touching disk. A file is
+    only copied into the overlay the first time it is modified; until then
+    reads fall through to disk. commit() flushes every staged file in one
+    batch: all temporary files are written, then fsynced in a single pass,
+    then atomically renamed into place.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, str] = {}
+
+    def _key(self, path: str) -> str:
+        return os.path.normpath(path)
+
+    def is_staged(self, path: str) -> bool:
+        return self._key(path) in self.files
+
+    def staged_paths(self) -> List[str]:
+        return sorted(self.files)
+
+    def exists(self, path: str) -> bool:
+        return self.is_staged(path) or os.path.exists(path)
+
+    def read(self, path: str) -> str:
+        """
+        Reads a file as seen through the overlay.
+
+        Args:
+            path: The path to the file.
+
+        Returns:
+            The staged content if the file has been staged, otherwise the content on disk.
+        """
+        key = self._key(path)
+        if key in self.files:
+            return self.files[key]
+        with open(path, "r") as file:
+            content = file.read()
+        record_bytes_read(len(content))
+        return content
+
+    def read_lines(self, path: str) -> List[str]:
+        return self.read(path).splitlines(keepends=True)
+
+    def write(self, path: str, content: str) -> None:
+        """Stages the full content of a file, replacing anything already staged."""
+        self.files[self._key(path)] = content
+
+    def append(self, path: str, content: str) -> None:
+        """Stages content to be appended to a file, copying the file into the overlay on first use."""
+        key = self._key(path)
+        if key not in self.files:
+            self.files[key] = self.read(path) if os.path.exists(path) else ""
+        self.files[key] += content
+
+    def discard(self, path: Optional[str] = None) -> None:
+        """Drops the staged changes for one file, or for all files if no path is given."""
+        if path is None:
+            self.files.clear()
+        else:
+            self.files.pop(self._key(path), None)
+
+    def commit(self) -> Dict:
+        """
+        Flushes all staged files to disk in one batch.
+
+        Returns:
+            A dictionary with the committed paths, or an error message. If a
+            temporary file cannot be written, nothing has been renamed into
+            place and the overlay is left intact. If a rename fails part way,
+            the files already renamed are reported as committed and the rest
+            stay staged. Temporary files are removed in either case.
+        """
+        pending = []
+        try:
+            for path, content in self.files.items():
+                if os.path.isdir(path):
+                    raise IsADirectoryError(f"{path} is a directory")
+                directory = os.path.dirname(path) or "."
+                os.makedirs(directory, exist_ok=True)
+                tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+                fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                pending.append((path, tmp_path, fd))
+                data = memoryview(content.encode("utf-8"))
+                while data:
+                    data = data[os.write(fd, data):]
+                if os.path.exists(path):
+                    os.chmod(tmp_path, os.stat(path).st_mode)
+            for _, _, fd in pending:
+                os.fsync(fd)
+        except Exception as e:
+            _close_all(pending)
+            _remove_all(pending)
+            return {"status": "error", "error": f"Error committing staged changes: {e}", "committed": []}
+        close_error = _close_all(pending)
+        if close_error is not None:
+            _remove_all(pending)
+            return {"status": "error", "error": f"Error committing staged changes: {close_error}", "committed": []}
+
+        committed = []
+        error = None
+        try:
+            for path, tmp_path, _ in pending:
+                os.replace(tmp_path, path)
+                committed.append(path)
+        except OSError as e:
+            _remove_all(pending[len(committed):])
+            error = f"Error committing staged changes after {len(committed)} of {len(pending)} files: {e}"
+        for directory in {os.path.dirname(path) or "." for path in committed}:
+            try:
+                dir_fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            except OSError as e:
+                error = error or f"Error syncing directory {directory}: {e}"
+
+        for path in committed:
+            del self.files[path]
+        committed.sort()
+        if error is not None:
+            return {"status": "error", "error": error, "committed": committed}
+        return {"status": "success", "committed": committed}
+
+
+def _close_all(pending: List) -> Optional[OSError]:
+    # Closes every descriptor even if some fail, returning the first failure.
+    error = None
+    for _, _, fd in pending:
+        try:
+            os.close(fd)
+        except OSError as e:
+            error = error or e
+    return error
+
+
+def _remove_all(pending: List) -> None:
+    for _, tmp_path, _ in pending:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
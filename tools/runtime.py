@@ -0,0 +1,502 @@
+import ast
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import tempfile
+import time
+import unittest
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+from tools.logger import Logger
+from tools.memory import Memory
+from tools.message import Message
+
+# Commands sent from the runtime to a worker's inbox.
+ADD_AGENT = "add"
+DELIVER = "deliver"
+STOP = "stop"
+
+# Events sent from workers to the runtime's shared outbox.
+SEND = "send"
+DONE = "done"
+FAILED = "failed"
+
+
+def _pack(message: Message) -> tuple:
+    return (message.sender, message.receiver, message.type, message.content)
+
+
+def _default_agent_factory(name: str, memory: Memory, logger: Logger):
+    # Imported here so the runtime itself does not pull in the LLM SDK.
+    from tools.agent import Agent
+    return Agent(name, memory, logger)
+
+
+class _OutboxLogger(Logger):
+    """A Logger that also forwards every message an agent sends to the runtime for routing."""
+
+    def __init__(self, outbox):
+        super().__init__()
+        self.outbox = outbox
+
+    def add_message(self, message):
+        self.outbox.put((SEND, _pack(message)))
+
+
+def _worker_main(worker_id: int, inbox, outbox, agent_factory: Callable, current) -> None:
+    agents = {}
+    # One mailbox per agent, served round-robin, so an agent with a deep backlog
+    # cannot hold up the other agents hosted on the same worker.
+    mailboxes: "OrderedDict[str, deque]" = OrderedDict()
+    logger = _OutboxLogger(outbox)
+
+    def handle(command) -> bool:
+        if command[0] == STOP:
+            return False
+        if command[0] == ADD_AGENT:
+            name = command[1]
+            agents[name] = agent_factory(name, Memory(), logger)
+            mailboxes.setdefault(name, deque())
+        elif command[0] == DELIVER:
+            _, message_id, packed = command
+            mailboxes.setdefault(packed[1], deque()).append((message_id, packed))
+        return True
+
+    while True:
+        pending = any(mailboxes.values())
+        try:
+            command = inbox.get_nowait() if pending else inbox.get()
+        except queue.Empty:
+            command = None
+        if command is not None:
+            if not handle(command):
+                return
+            # Drain whatever else has arrived before processing, to fill the mailboxes fairly.
+            while True:
+                try:
+                    command = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if not handle(command):
+                    return
+        for name, mailbox in list(mailboxes.items()):
+            if not mailbox:
+                continue
+            message_id, packed = mailbox.popleft()
+            agent = agents.get(name)
+            # Tells the supervisor which message was being handled if this process dies.
+            current.value = message_id
+            try:
+                if agent is None:
+                    raise KeyError(f"Agent '{name}' is not hosted on worker {worker_id}.")
+                agent.receive_message(Message(*packed))
+                current.value = -1
+                outbox.put((DONE, worker_id, message_id))
+            except Exception as e:
+                current.value = -1
+                outbox.put((FAILED, worker_id, message_id, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id
+        self.process = None
+        self.inbox = None
+        # The id of the message the process is handling, or -1; shared memory the process writes to.
+        self.current = None
+        self.agents: List[str] = []
+        self.in_flight: Dict[int, tuple] = {}
+        # How many times each in-flight message was being handled when the process died.
+        self.attempts: Dict[int, int] = {}
+        self.processed = 0
+        self.restarts = 0
+        self.given_up = False
+
+    @property
+    def load(self) -> int:
+        return len(self.in_flight)
+
+
+class AgentRuntime:
+    """
+    Hosts agents across a pool of worker processes.
+
+    Each agent lives in exactly one worker, chosen as the least loaded worker
+    when the agent is added. Messages are delivered to the receiver's worker
+    through its inbox queue. Messages an agent sends through its logger are
+    routed back through a shared outbox to their receiver's worker.
+
+    A supervisor thread restarts a worker that dies, re-creates its agents and
+    redelivers the messages it had not finished. Delivery is therefore
+    at-least-once, and agent memory does not survive a restart. A message
+    that was being handled each time its worker died, max_attempts times in
+    all, is moved to dead_letters instead of being redelivered again. After
+    max_restarts restarts the worker is given up on: its unfinished messages
+    are dead-lettered and its agents can no longer be sent to.
+    """
+
+    def __init__(self, workers: Optional[int] = None, agent_factory: Callable = _default_agent_factory,
+                 start_method: str = "spawn", max_restarts: int = 5, max_attempts: int = 3):
+        self.context = multiprocessing.get_context(start_method)
+        self.agent_factory = agent_factory
+        self.max_restarts = max_restarts
+        self.max_attempts = max_attempts
+        self.workers = [_Worker(i) for i in range(workers or os.cpu_count() or 1)]
+        self.placement: Dict[str, _Worker] = {}
+        self.outbox = None
+        self.failures: List[Dict] = []
+        self.undeliverable: List[Message] = []
+        self.dead_letters: List[Dict] = []
+        self._ids = itertools.count()
+        self._lock = threading.Condition()
+        self._router = None
+        self._running = False
+
+    def _spawn(self, worker: _Worker) -> None:
+        worker.inbox = self.context.Queue()
+        worker.current = self.context.Value("q", -1, lock=False)
+        worker.process = self.context.Process(
+            target=_worker_main,
+            args=(worker.worker_id, worker.inbox, self.outbox, self.agent_factory, worker.current),
+            name=f"agent-worker-{worker.worker_id}",
+            daemon=True,
+        )
+        worker.process.start()
+        for name in worker.agents:
+            worker.inbox.put((ADD_AGENT, name))
+        for message_id, packed in worker.in_flight.items():
+            worker.inbox.put((DELIVER, message_id, packed))
+
+    def start(self) -> None:
+        """Starts the worker processes and the routing/supervisor thread."""
+        if self._running:
+            return
+        self.outbox = self.context.Queue()
+        for worker in self.workers:
+            self._spawn(worker)
+        self._running = True
+        self._router = threading.Thread(target=self._route, name="agent-runtime-router", daemon=True)
+        self._router.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stops all workers. Messages still in flight are dropped."""
+        if not self._running:
+            return
+        self._running = False
+        self._router.join()
+        for worker in self.workers:
+            worker.inbox.put((STOP,))
+        for worker in self.workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    def add_agent(self, name: str) -> int:
+        """
+        Creates an agent on the least loaded worker that has not been given up on.
+
+        Args:
+            name: The agent's name, which messages use as their receiver.
+
+        Returns:
+            The id of the worker hosting the agent.
+        """
+        with self._lock:
+            if name in self.placement:
+                raise ValueError(f"Agent '{name}' already exists.")
+            workers = [worker for worker in self.workers if not worker.given_up]
+            if not workers:
+                raise RuntimeError("Every agent worker has been given up on.")
+            worker = min(workers, key=lambda w: (w.load, len(w.agents)))
+            worker.agents.append(name)
+            self.placement[name] = worker
+            if self._running:
+                worker.inbox.put((ADD_AGENT, name))
+            return worker.worker_id
+
+    def send(self, message: Message) -> Optional[int]:
+        """
+        Delivers a message to the worker hosting its receiver.
+
+        Messages sent before start() are held and delivered once the worker starts.
+
+        Args:
+            message: The message to deliver.
+
+        Returns:
+            The message id, or None if no agent with that name exists.
+
+        Raises:
+            RuntimeError: If the receiver's worker has been given up on.
+        """
+        with self._lock:
+            worker = self.placement.get(message.receiver)
+            if worker is None:
+                self.undeliverable.append(message)
+                return None
+            if worker.given_up:
+                raise RuntimeError(
+                    f"Agent '{message.receiver}' is hosted on worker {worker.worker_id}, "
+                    f"which was given up on after {self.max_restarts} restarts."
+                )
+            message_id = next(self._ids)
+            packed = _pack(message)
+            worker.in_flight[message_id] = packed
+            if self._running:
+                worker.inbox.put((DELIVER, message_id, packed))
+            return message_id
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(worker.load for worker in self.workers)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until every delivered message, including ones agents sent in response, has been processed.
+
+        Returns:
+            True if the runtime went idle, False on timeout or if a worker has been given up on.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while any(worker.in_flight for worker in self.workers):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return not any(worker.given_up for worker in self.workers)
+
+    def _route(self) -> None:
+        while self._running:
+            try:
+                event = self.outbox.get(timeout=0.2)
+            except queue.Empty:
+                self._supervise()
+                continue
+            if event[0] == SEND:
+                try:
+                    self.send(Message(*event[1]))
+                except RuntimeError as e:
+                    with self._lock:
+                        self._dead_letter(None, None, event[1], str(e))
+                continue
+            with self._lock:
+                worker = self.workers[event[1]]
+                if worker.in_flight.pop(event[2], None) is not None:
+                    worker.processed += 1
+                worker.attempts.pop(event[2], None)
+                if event[0] == FAILED:
+                    self.failures.append({"worker": event[1], "message_id": event[2], "error": event[3]})
+                    logging.error(f"Agent worker {event[1]} failed to process message {event[2]}: {event[3]}")
+                self._lock.notify_all()
+            self._supervise()
+
+    def _dead_letter(self, worker: Optional[_Worker], message_id: Optional[int], packed: tuple, error: str) -> None:
+        self.dead_letters.append({
+            "worker": None if worker is None else worker.worker_id,
+            "message_id": message_id,
+            "message": Message(*packed),
+            "attempts": 0 if worker is None else worker.attempts.pop(message_id, 0),
+            "error": error,
+        })
+        logging.error(f"Dead-lettered message {message_id} for '{packed[1]}': {error}")
+
+    def _supervise(self) -> None:
+        with self._lock:
+            for worker in self.workers:
+                if not self._running or worker.given_up or worker.process.is_alive():
+                    continue
+                culprit = worker.current.value
+                if culprit in worker.in_flight:
+                    worker.attempts[culprit] = worker.attempts.get(culprit, 0) + 1
+                    if worker.attempts[culprit] >= self.max_attempts:
+                        error = f"Worker {worker.worker_id} died while handling it {self.max_attempts} times."
+                        self._dead_letter(worker, culprit, worker.in_flight.pop(culprit), error)
+                        self._lock.notify_all()
+                if worker.restarts >= self.max_restarts:
+                    worker.given_up = True
+                    error = f"Worker {worker.worker_id} was given up on after {self.max_restarts} restarts."
+                    for message_id, packed in list(worker.in_flight.items()):
+                        self._dead_letter(worker, message_id, packed, error)
+                    worker.in_flight.clear()
+                    self._lock.notify_all()
+                    continue
+                worker.restarts += 1
+                logging.error(f"Agent worker {worker.worker_id} exited with code {worker.process.exitcode}; restarting.")
+                self._spawn(worker)
+
+    def stats(self) -> Dict:
+        """Returns per-worker agent counts, queue depth, processed messages and restarts."""
+        with self._lock:
+            return {
+                "workers": [
+                    {
+                        "worker": worker.worker_id,
+                        "alive": worker.process is not None and worker.process.is_alive(),
+                        "agents": list(worker.agents),
+                        "in_flight": worker.load,
+                        "processed": worker.processed,
+                        "restarts": worker.restarts,
+                        "given_up": worker.given_up,
+                    }
+                    for worker in self.workers
+                ],
+                "failures": len(self.failures),
+                "undeliverable": len(self.undeliverable),
+                "dead_letters": len(self.dead_letters),
+            }
+
+
+class ParsingAgent:
+    """A CPU-bound stand-in agent for measuring runtime throughput: it parses Python source for every message."""
+
+    def __init__(self, name: str, memory: Memory, logger: Logger):
+        self.name = name
+        self.memory = memory
+        self.logger = logger
+
+    def receive_message(self, message: Message):
+        tree = ast.parse(message.content["source"])
+        self.memory.add_data("last_node_count", sum(1 for _ in ast.walk(tree)))
+
+
+def measure_scaling(worker_counts: Optional[List[int]] = None, agents: int = 16, messages: int = 2000,
+                    functions_per_message: int = 50) -> List[Dict]:
+    """
+    Measures message throughput of the runtime for different numbers of worker processes.
+
+    Args:
+        worker_counts: The pool sizes to measure. Defaults to 1, 2, 4, ... up to the number of cores.
+        agents: The number of ParsingAgents to host.
+        messages: The number of messages to process per measurement.
+        functions_per_message: The size of the source each message asks an agent to parse.
+
+    Returns:
+        One dictionary per pool size with the elapsed time and messages per second.
+    """
+    if worker_counts is None:
+        cores = os.cpu_count() or 1
+        worker_counts = sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    source = "\n".join(f"def function_{i}(a, b):\n    return [a * b for _ in range({i})]\n" for i in range(functions_per_message))
+    results = []
+    for count in worker_counts:
+        runtime = AgentRuntime(workers=count, agent_factory=ParsingAgent)
+        names = [f"agent_{i}" for i in range(agents)]
+        for name in names:
+            runtime.add_agent(name)
+        runtime.start()
+        try:
+            # Warm up so process start-up is not measured.
+            for name in names:
+                runtime.send(Message("benchmark", name, "OBSERVATION", {"source": "pass"}))
+            runtime.wait()
+            start = time.perf_counter()
+            for i in range(messages):
+                runtime.send(Message("benchmark", names[i % agents], "OBSERVATION", {"source": source}))
+            runtime.wait()
+            elapsed = time.perf_counter() - start
+        finally:
+            runtime.stop()
+        results.append({"workers": count, "messages": messages, "seconds": elapsed, "messages_per_second": messages / elapsed})
+    return results
+
+
+class _EchoAgent:
+    """
+    A test agent that forwards every message's content to "collector".
+
+    No agent has that name, so the replies collect in the runtime's
+    undeliverable list in processing order.
+    """
+
+    def __init__(self, name: str, memory: Memory, logger: Logger):
+        self.name = name
+        self.logger = logger
+
+    def receive_message(self, message: Message):
+        crash_marker = message.content.get("crash_once")
+        if crash_marker and not os.path.exists(crash_marker):
+            open(crash_marker, "w").close()
+            os._exit(1)
+        if message.content.get("crash_always"):
+            os._exit(1)
+        time.sleep(message.content.get("delay", 0))
+        self.logger.add_message(Message(self.name, "collector", "OBSERVATION", message.content))
+
+
+class TestAgentRuntime(unittest.TestCase):
+    def setUp(self):
+        self.runtime = AgentRuntime(workers=1, agent_factory=_EchoAgent)
+        self.runtime.add_agent("busy")
+        self.runtime.add_agent("idle")
+
+    def tearDown(self):
+        self.runtime.stop()
+
+    def replies(self) -> List:
+        return [message.content for message in self.runtime.undeliverable]
+
+    def test_send_before_start(self):
+        self.assertIsNotNone(self.runtime.send(Message("test", "busy", "OBSERVATION", {"n": 1})))
+        self.assertIsNone(self.runtime.send(Message("test", "nobody", "OBSERVATION", {})))
+        self.runtime.start()
+        self.assertTrue(self.runtime.wait(30))
+        self.assertEqual(self.replies(), [{}, {"n": 1}])
+
+    def test_restart_redelivers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.runtime.start()
+            self.runtime.send(Message("test", "busy", "OBSERVATION", {"crash_once": os.path.join(directory, "crashed")}))
+            self.assertTrue(self.runtime.wait(30))
+        stats = self.runtime.stats()
+        self.assertEqual(stats["workers"][0]["restarts"], 1)
+        self.assertEqual(stats["workers"][0]["processed"], 1)
+        self.assertEqual(len(self.replies()), 1)
+
+    def test_poison_message_is_dead_lettered(self):
+        self.runtime = AgentRuntime(workers=1, agent_factory=_EchoAgent, max_attempts=2)
+        self.runtime.add_agent("busy")
+        self.runtime.add_agent("idle")
+        self.runtime.start()
+        poison = self.runtime.send(Message("test", "busy", "OBSERVATION", {"crash_always": True}))
+        self.runtime.send(Message("test", "idle", "OBSERVATION", {"agent": "idle"}))
+        self.assertTrue(self.runtime.wait(60))
+        self.assertEqual([(letter["message_id"], letter["attempts"]) for letter in self.runtime.dead_letters], [(poison, 2)])
+        self.assertIn({"agent": "idle"}, self.replies())
+        self.assertEqual(self.runtime.stats()["workers"][0]["restarts"], 2)
+        # The worker keeps serving the agent once the poison message is gone.
+        self.assertIsNotNone(self.runtime.send(Message("test", "busy", "OBSERVATION", {"n": 1})))
+        self.assertTrue(self.runtime.wait(60))
+        self.assertIn({"n": 1}, self.replies())
+
+    def test_worker_given_up(self):
+        self.runtime = AgentRuntime(workers=1, agent_factory=_EchoAgent, max_restarts=1, max_attempts=5)
+        self.runtime.add_agent("busy")
+        self.runtime.start()
+        self.runtime.send(Message("test", "busy", "OBSERVATION", {"crash_always": True}))
+        self.assertFalse(self.runtime.wait(60))
+        self.assertEqual(len(self.runtime.dead_letters), 1)
+        self.assertTrue(self.runtime.stats()["workers"][0]["given_up"])
+        with self.assertRaises(RuntimeError):
+            self.runtime.send(Message("test", "busy", "OBSERVATION", {}))
+
+    def test_round_robin(self):
+        # Queued before start, so the worker receives the whole backlog at once.
+        for i in range(10):
+            self.runtime.send(Message("test", "busy", "OBSERVATION", {"agent": "busy", "delay": 0.05}))
+        self.runtime.send(Message("test", "idle", "OBSERVATION", {"agent": "idle"}))
+        self.runtime.start()
+        self.assertTrue(self.runtime.wait(30))
+        order = [reply["agent"] for reply in self.replies()]
+        self.assertEqual(len(order), 11)
+        # The idle agent's message is not stuck behind the busy agent's backlog.
+        self.assertLess(order.index("idle"), 3)
+
+
+if __name__ == '__main__':
+    import json
+    print(json.dumps({"cpu_count": os.cpu_count(), "results": measure_scaling()}, indent=2))
@@ -0,0 +1,361 @@
+"""
+A long-lived local server for the agent tools.
+
+Usage:
+    python -m tools.server [--socket PATH]
+
+Clients connect to a Unix socket and exchange JSON lines. Each request is
+{"id": ..., "tool": "<name>", "args": {...}} and each response is
+{"id": ..., "result": {...}} or {"id": ..., "error": "..."}. The built-in
+"list_tools" and "server_stats" requests describe the server itself.
+
+Tools that need the user's approval never wait for it. They return their
+"request_id"; the client answers with receive_approval_response (from any
+connection) and repeats the call with that request_id. Only IDs the tools
+issued are accepted, and each one resumes only the call it was issued for.
+
+Tool modules are imported on the first call that needs them and then stay
+loaded, so the line indexes, summaries, symbol table, staging overlay and
+telemetry ingesters built by earlier calls are reused by later ones.
+"""
+import argparse
+import errno
+import importlib
+import json
+import os
+import shutil
+import socket
+import socketserver
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_SOCKET_PATH = os.environ.get("NEUROSYNC_TOOL_SOCKET", "/tmp/neurosync-tools.sock")
+
+# Tool name -> module defining it. Modules are only imported when one of their tools is first called.
+TOOL_REGISTRY: Dict[str, str] = {
+    name: "tools.tools"
+    for name in [
+        "get_file_content_summary", "natural_language_write_file", "run_terminal_command",
+        "run_static_analysis", "get_dependencies", "receive_approval_response", "read_file",
+        "commit_staged_changes", "discard_staged_changes", "simulate_ui_approval", "find_code_usage",
+        "find_code_usages", "index_symbols", "find_definition", "search_symbols", "modify_code_structure",
+        "use_llm", "observe_application", "export_metrics",
+    ]
+}
+
+
+class ToolRegistry:
+    """Resolves tool names to functions, importing each tool module lazily on first use."""
+
+    def __init__(self, registry: Dict[str, str] = TOOL_REGISTRY):
+        self.registry = registry
+        self.functions: Dict[str, Callable] = {}
+        self.import_seconds: Dict[str, float] = {}
+
+    def resolve(self, name: str) -> Callable:
+        function = self.functions.get(name)
+        if function is not None:
+            return function
+        module_name = self.registry.get(name)
+        if module_name is None:
+            raise KeyError(f"Unknown tool: {name}")
+        if module_name not in sys.modules:
+            start = time.perf_counter()
+            importlib.import_module(module_name)
+            self.import_seconds[module_name] = time.perf_counter() - start
+        function = getattr(sys.modules[module_name], name)
+        self.functions[name] = function
+        return function
+
+
+def _is_listening(socket_path: str) -> bool:
+    """Returns whether a server accepts connections on the Unix socket at socket_path."""
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+class ToolServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves tool calls over a Unix socket using a JSON-lines protocol.
+
+    Connections are handled on separate threads, but tool calls run one at a
+    time because the tools share module-level state (overlay, caches, indexes).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, registry: Optional[ToolRegistry] = None):
+        if os.path.exists(socket_path):
+            if _is_listening(socket_path):
+                raise OSError(errno.EADDRINUSE, f"A tool server is already listening on {socket_path}")
+            # A socket nothing answers on was left behind by a server that did not shut down cleanly.
+            os.unlink(socket_path)
+        self.socket_path = socket_path
+        self.tools = registry or ToolRegistry()
+        self.call_lock = threading.Lock()
+        self.started = time.time()
+        self.calls = 0
+        super().__init__(socket_path, _ToolRequestHandler)
+
+    def handle_request_line(self, line: bytes) -> Dict:
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {"id": None, "error": f"Invalid JSON request: {e}"}
+        if not isinstance(request, dict):
+            return {"id": None, "error": "Invalid request: expected a JSON object."}
+        request_id = request.get("id")
+        tool = request.get("tool")
+        args = request.get("args")
+        if args is None:
+            args = {}
+        if not isinstance(args, dict):
+            return {"id": request_id, "error": "Invalid request: args must be a JSON object."}
+        if tool == "list_tools":
+            return {"id": request_id, "result": {"tools": sorted(self.tools.registry), "status": "success"}}
+        if tool == "server_stats":
+            return {"id": request_id, "result": self.stats()}
+        try:
+            function = self.tools.resolve(tool)
+        except Exception as e:
+            return {"id": request_id, "error": f"Error loading tool '{tool}': {e}"}
+        try:
+            with self.call_lock:
+                self.calls += 1
+                result = function(**args)
+        except Exception as e:
+            return {"id": request_id, "error": f"Error running tool '{tool}': {type(e).__name__}: {e}"}
+        return {"id": request_id, "result": result}
+
+    def stats(self) -> Dict:
+        return {
+            "status": "success",
+            "pid": os.getpid(),
+            "uptime_s": time.time() - self.started,
+            "calls": self.calls,
+            "loaded_tools": sorted(self.tools.functions),
+            "import_seconds": dict(self.tools.import_seconds),
+        }
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class _ToolRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.handle_request_line(line)
+            self.wfile.write(json.dumps(response, default=str).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class ToolClient:
+    """A client holding one connection to a ToolServer."""
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: Optional[float] = None):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(socket_path)
+        self.reader = self.socket.makefile("rb")
+        self.next_id = 0
+
+    def call(self, tool: str, **args) -> Dict:
+        """
+        Calls a tool on the server.
+
+        Args:
+            tool: The tool name.
+            **args: The tool's keyword arguments.
+
+        Returns:
+            The tool's result dictionary, or {"error": ...} if the server could not run it.
+        """
+        self.next_id += 1
+        request = {"id": self.next_id, "tool": tool, "args": args}
+        self.socket.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        line = self.reader.readline()
+        if not line:
+            return {"error": "Tool server closed the connection."}
+        response = json.loads(line)
+        if "error" in response:
+            return {"error": response["error"]}
+        return response["result"]
+
+    def close(self) -> None:
+        self.reader.close()
+        self.socket.close()
+
+
+def measure_latency(tool: str, args: Optional[Dict] = None, repeat: int = 20, cwd: Optional[str] = None,
+                    registry: Dict[str, str] = TOOL_REGISTRY) -> Dict:
+    """
+    Compares a tool call in a fresh process with the same call against a warm server.
+
+    The cold measurement starts a new interpreter, imports the tool's module
+    and calls the tool once, which is what a one-shot invocation pays today.
+
+    Args:
+        tool: The tool name.
+        args: The tool's keyword arguments.
+        repeat: The number of cold and warm calls to time.
+        cwd: The working directory for the calls.
+        registry: The tool registry to resolve the tool from.
+
+    Returns:
+        A dictionary of median timings in seconds.
+    """
+    args = args or {}
+    module_name = registry[tool]
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (
+        "import json, sys, time\n"
+        f"sys.path.insert(0, {package_root!r})\n"
+        "start = time.perf_counter()\n"
+        f"import {module_name} as module\n"
+        "imported = time.perf_counter()\n"
+        f"getattr(module, {tool!r})(**json.loads(sys.argv[1]))\n"
+        "print(json.dumps({'import_s': imported - start, 'call_s': time.perf_counter() - imported}))\n"
+    )
+    cold_process, cold_import, cold_call = [], [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", script, json.dumps(args)], cwd=cwd,
+                                   capture_output=True, text=True)
+        cold_process.append(time.perf_counter() - start)
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "unknown error"
+            return {"error": f"Cold call failed: {error}"}
+        timings = json.loads(completed.stdout.strip().splitlines()[-1])
+        cold_import.append(timings["import_s"])
+        cold_call.append(timings["call_s"])
+
+    socket_path = os.path.join("/tmp", f"neurosync-tools-bench-{os.getpid()}.sock")
+    previous_cwd = os.getcwd()
+    if cwd:
+        os.chdir(cwd)
+    server = ToolServer(socket_path, ToolRegistry(registry))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = ToolClient(socket_path)
+        first_start = time.perf_counter()
+        first = client.call(tool, **args)
+        first_call = time.perf_counter() - first_start
+        if "error" in first:
+            return {"error": f"Server call failed: {first['error']}"}
+        warm = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            client.call(tool, **args)
+            warm.append(time.perf_counter() - start)
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        os.chdir(previous_cwd)
+    return {
+        "tool": tool,
+        "cold_process_s": statistics.median(cold_process),
+        "cold_import_s": statistics.median(cold_import),
+        "cold_call_s": statistics.median(cold_call),
+        "server_first_call_s": first_call,
+        "warm_call_s": statistics.median(warm),
+    }
+
+
+class TestToolServer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.directory, "tools.sock")
+        self.server = ToolServer(self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = ToolClient(self.socket_path, timeout=10)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_tool_calls(self):
+        self.assertIn("read_file", self.client.call("list_tools")["tools"])
+        path = os.path.join(self.directory, "lines.txt")
+        with open(path, "w") as f:
+            f.write("one\ntwo\nthree\n")
+        self.assertEqual(self.client.call("read_file", path=path, start_line=2, end_line=2)["content"], "two\n")
+        self.assertEqual(self.client.call("read_file", path=path, start_byte=0, end_byte=3)["content"], "one")
+        stats = self.client.call("server_stats")
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["loaded_tools"], ["read_file"])
+        self.assertIn("Unknown tool", self.client.call("no_such_tool")["error"])
+        self.assertIn("TypeError", self.client.call("read_file", missing_argument=1)["error"])
+
+    def test_socket_in_use(self):
+        with self.assertRaises(OSError):
+            ToolServer(self.socket_path)
+        self.assertEqual(self.client.call("server_stats")["status"], "success")
+        stale = os.path.join(self.directory, "stale.sock")
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(stale)
+        listener.close()
+        server = ToolServer(stale)
+        server.server_close()
+
+    def test_malformed_requests(self):
+        for line in [b"[1, 2]", b"5", b'{"id": 7, "tool": "read_file", "args": [1]}', b"\xff\n"]:
+            self.client.socket.sendall(line + b"\n")
+            self.assertIn("error", json.loads(self.client.reader.readline()))
+        # The connection is still served afterwards.
+        self.assertEqual(self.client.call("server_stats")["status"], "success")
+
+    def test_approval_round_trip(self):
+        pending = self.client.call("run_terminal_command", command="rm -rf build")
+        self.assertEqual(pending["status"], "pending_approval")
+        # The approval arrives on another connection while the first one stays open.
+        approver = ToolClient(self.socket_path, timeout=10)
+        try:
+            self.assertEqual(approver.call("receive_approval_response", request_id=pending["request_id"], approved=True)["status"], "success")
+        finally:
+            approver.close()
+        result = self.client.call("run_terminal_command", command="rm -rf build", request_id=pending["request_id"])
+        self.assertEqual(result["status"], "success")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the agent tools over a Unix socket.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="path of the Unix socket to listen on")
+    args = parser.parse_args(argv)
+    try:
+        server = ToolServer(args.socket)
+    except OSError as e:
+        print(f"Cannot start the tool server: {e}", file=sys.stderr)
+        return 1
+    print(f"Tool server listening on {args.socket}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+import ast
+import difflib
+import json
+import os
+import re
+from bisect import bisect_left, insort
+from typing import Callable, Dict, List, Optional, Tuple
+
+PYTHON_EXTENSIONS = (".py",)
+SCRIPT_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx")
+
+# Top-level and exported declarations in TS/JS. Matched line by line, so nested
+# functions are not indexed; that is enough for "where is X defined?".
+SCRIPT_DEFINITION = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?"
+    r"(?:(?P<kind>function\*?|class|interface|type|enum)\s+(?P<name>[A-Za-z_$][\w$]*)"
+    r"|(?:const|let|var)\s+(?P<var>[A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|[A-Za-z_$][\w$]*\s*=>))"
+)
+
+
+def _read(path: str) -> str:
+    with open(path, "r") as file:
+        return file.read()
+
+
+def extract_python_symbols(path: str, content: str, tree: Optional[ast.AST] = None) -> List[Dict]:
+    """
+    Extracts function and class definitions from Python source.
+
+    Args:
+        path: The path the source was read from.
+        content: The source code.
+        tree: An already parsed AST for the source, to avoid parsing it twice.
+
+    Returns:
+        A list of symbol dictionaries with name, qualified_name, kind, file, line and signature.
+    """
+    if tree is None:
+        tree = ast.parse(content)
+    symbols = []
+
+    def visit(node: ast.AST, scope: List[Tuple[str, str]]):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                prefix = "async def" if isinstance(child, ast.AsyncFunctionDef) else "def"
+                signature = f"{prefix} {child.name}({ast.unparse(child.args)})"
+                if child.returns is not None:
+                    signature += f" -> {ast.unparse(child.returns)}"
+                kind = "method" if scope and scope[-1][0] == "class" else "function"
+            elif isinstance(child, ast.ClassDef):
+                bases = ", ".join(ast.unparse(base) for base in child.bases)
+                signature = f"class {child.name}({bases})" if bases else f"class {child.name}"
+                kind = "class"
+            else:
+                visit(child, scope)
+                continue
+            symbols.append({
+                "name": child.name,
+                "qualified_name": ".".join([name for _, name in scope] + [child.name]),
+                "kind": kind,
+                "file": path,
+                "line": child.lineno,
+                "signature": signature,
+            })
+            visit(child, scope + [(kind, child.name)])
+
+    visit(tree, [])
+    return symbols
+
+
+def extract_script_symbols(path: str, content: str) -> List[Dict]:
+    """
+    Extracts top-level function, class, interface, type and arrow-function definitions from TS/JS source.
+
+    Args:
+        path: The path the source was read from.
+        content: The source code.
+
+    Returns:
+        A list of symbol dictionaries with name, qualified_name, kind, file, line and signature.
+    """
+    symbols = []
+    for line_number, line in enumerate(content.splitlines(), start=1):
+        match = SCRIPT_DEFINITION.match(line)
+        if not match:
+            continue
+        if match.group("name"):
+            name, kind = match.group("name"), match.group("kind").rstrip("*")
+        else:
+            name, kind = match.group("var"), "function"
+        symbols.append({
+            "name": name,
+            "qualified_name": name,
+            "kind": kind,
+            "file": path,
+            "line": line_number,
+            "signature": line.strip().rstrip("{").strip(),
+        })
+    return symbols
+
+
+class SymbolTable:
+    """
+    A project-wide index of symbol definitions.
+
+    Definitions are kept in a hash index keyed by name (and by qualified name
+    for methods), so exact lookups are O(1). A sorted list of all names backs
+    prefix lookups with a binary search. Files are indexed independently, so
+    re-indexing one file only touches that file's entries.
+    """
+
+    def __init__(self, reader: Callable[[str], str] = _read):
+        self.reader = reader
+        self.definitions: Dict[str, List[Dict]] = {}
+        self.file_symbols: Dict[str, List[Dict]] = {}
+        self.file_mtimes: Dict[str, int] = {}
+        self.names: List[str] = []
+        # Set once a whole directory has been indexed; files indexed one at a time do not count.
+        self.project_indexed = False
+
+    def _keys(self, symbol: Dict) -> List[str]:
+        if symbol["qualified_name"] != symbol["name"]:
+            return [symbol["name"], symbol["qualified_name"]]
+        return [symbol["name"]]
+
+    def _add(self, symbol: Dict) -> None:
+        for key in self._keys(symbol):
+            if key not in self.definitions:
+                self.definitions[key] = []
+                insort(self.names, key)
+            self.definitions[key].append(symbol)
+
+    def _discard(self, symbol: Dict) -> None:
+        for key in self._keys(symbol):
+            entries = self.definitions.get(key)
+            if entries is None:
+                continue
+            entries.remove(symbol)
+            if not entries:
+                del self.definitions[key]
+                del self.names[bisect_left(self.names, key)]
+
+    def remove_file(self, path: str) -> None:
+        """Removes every definition that came from the given file, or from files under it if it is a directory."""
+        path = os.path.normpath(path)
+        prefix = path + os.sep
+        for indexed in [p for p in self.file_symbols if p == path or p.startswith(prefix)]:
+            for symbol in self.file_symbols.pop(indexed):
+                self._discard(symbol)
+            self.file_mtimes.pop(indexed, None)
+
+    def update_file(self, path: str, content: Optional[str] = None, tree: Optional[ast.AST] = None) -> List[Dict]:
+        """
+        (Re)indexes a single file, replacing its previous definitions.
+
+        Args:
+            path: The path to the file.
+            content: The file's content, if already read. Read through the table's reader otherwise.
+            tree: An already parsed Python AST for the content.
+
+        Returns:
+            The symbols now indexed for the file.
+        """
+        path = os.path.normpath(path)
+        if content is None:
+            content = self.reader(path)
+        if path.endswith(PYTHON_EXTENSIONS):
+            try:
+                symbols = extract_python_symbols(path, content, tree)
+            except SyntaxError:
+                symbols = []
+        elif path.endswith(SCRIPT_EXTENSIONS):
+            symbols = extract_script_symbols(path, content)
+        else:
+            return []
+        self.remove_file(path)
+        self.file_symbols[path] = symbols
+        try:
+            self.file_mtimes[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self.file_mtimes[path] = 0
+        for symbol in symbols:
+            self._add(symbol)
+        return symbols
+
+    def index_project(self, root: str = ".", ignore_dirs=(".git", "node_modules", "__pycache__", ".next")) -> Dict:
+        """
+        Indexes every Python and TS/JS file under a directory, skipping files unchanged since they were last indexed.
+
+        Args:
+            root: The directory to index.
+            ignore_dirs: Directory names that are not descended into.
+
+        Returns:
+            A dictionary with the number of files indexed and skipped.
+        """
+        indexed = skipped = 0
+        seen = set()
+        for directory, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if d not in ignore_dirs]
+            for file in files:
+                if not file.endswith(PYTHON_EXTENSIONS + SCRIPT_EXTENSIONS):
+                    continue
+                path = os.path.normpath(os.path.join(directory, file))
+                seen.add(path)
+                try:
+                    if self.file_mtimes.get(path) == os.stat(path).st_mtime_ns:
+                        skipped += 1
+                        continue
+                    self.update_file(path)
+                    indexed += 1
+                except (OSError, UnicodeDecodeError):
+                    continue
+        root = os.path.normpath(root)
+        for path in list(self.file_symbols):
+            if path not in seen and (root == "." or path == root or path.startswith(root + os.sep)):
+                self.remove_file(path)
+        self.project_indexed = True
+        return {"indexed": indexed, "skipped": skipped, "symbols": len(self.names)}
+
+    def apply_changes(self, batch: Dict) -> None:
+        """
+        Applies a change-feed batch (see tools.change_feed.ChangeFeed) to the index.
+
+        Args:
+            batch: A dictionary with "created", "modified" and "deleted" path lists and a "rescan" flag.
+        """
+        if batch.get("rescan"):
+            self.file_mtimes.clear()
+            self.index_project()
+            return
+        for path in batch.get("deleted", []):
+            self.remove_file(path)
+        for path in batch.get("created", []) + batch.get("modified", []):
+            try:
+                self.update_file(path)
+            except (OSError, UnicodeDecodeError):
+                self.remove_file(path)
+
+    def find_definition(self, name: str) -> List[Dict]:
+        """Returns every definition of a name or qualified name (e.g. "MyClass.method")."""
+        return list(self.definitions.get(name, []))
+
+    def find_prefix(self, prefix: str, limit: int = 50) -> List[str]:
+        """Returns up to limit indexed names starting with prefix, in sorted order."""
+        start = bisect_left(self.names, prefix)
+        matches = []
+        for name in self.names[start:]:
+            if not name.startswith(prefix) or len(matches) >= limit:
+                break
+            matches.append(name)
+        return matches
+
+    def find_fuzzy(self, query: str, limit: int = 10, cutoff: float = 0.6) -> List[str]:
+        """Returns up to limit indexed names that approximately match query, best match first."""
+        return difflib.get_close_matches(query, self.names, n=limit, cutoff=cutoff)
+
+    def save(self, path: str) -> None:
+        """Writes the index to a JSON file so it can be reloaded without re-parsing unchanged files."""
+        with open(path, "w") as file:
+            json.dump({"files": self.file_symbols, "mtimes": self.file_mtimes}, file)
+
+    def load(self, path: str) -> None:
+        """Replaces the index with one previously written by save()."""
+        with open(path, "r") as file:
+            data = json.load(file)
+        self.definitions, self.file_symbols, self.file_mtimes = {}, {}, {}
+        for file_path, symbols in data["files"].items():
+            self.file_symbols[file_path] = symbols
+            self.file_mtimes[file_path] = data["mtimes"].get(file_path, 0)
+            for symbol in symbols:
+                for key in self._keys(symbol):
+                    self.definitions.setdefault(key, []).append(symbol)
+        self.names = sorted(self.definitions)
+        self.project_indexed = True
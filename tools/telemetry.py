@@ -0,0 +1,240 @@
+import json
+import math
+import os
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+from tools.metrics import record_bytes_read
+
+DEFAULT_WINDOW = 1000
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+class QuantileSketch:
+    """
+    A streaming quantile estimator with bounded relative error.
+
+    Values are counted in logarithmically sized buckets, so memory grows with
+    the spread of the values rather than their number, and any quantile is
+    accurate to within relative_accuracy of the true value.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        if value < 0:
+            raise ValueError("QuantileSketch only accepts non-negative values.")
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value == 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Returns the estimated q-quantile (0 <= q <= 1), or None if no values were added."""
+        if self.count == 0:
+            return None
+        rank = math.ceil(q * (self.count - 1))
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                estimate = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+
+class UrlStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.durations = QuantileSketch()
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "error_rate": self.errors / self.count if self.count else 0.0,
+            "p50": self.durations.quantile(0.50),
+            "p95": self.durations.quantile(0.95),
+            "p99": self.durations.quantile(0.99),
+        }
+
+
+def _from_har_entry(entry: Dict) -> Dict:
+    return {
+        "url": entry.get("request", {}).get("url"),
+        "method": entry.get("request", {}).get("method"),
+        "status": entry.get("response", {}).get("status"),
+        "duration": entry.get("time"),
+    }
+
+
+class TelemetryIngester:
+    """
+    Incrementally ingests console and network telemetry and keeps rolling aggregates.
+
+    Entries are either network requests (with "url", "method", "status" and
+    "duration") or console logs (with "type" and "message"). They can be fed
+    directly with ingest(), or read from a JSONL or HAR file with poll(), which
+    resumes from the saved offset: a byte offset for JSONL (only complete lines
+    are consumed) and an entry count for HAR. A HAR file has to be re-parsed
+    in full whenever it changes, so JSONL is the better source for large
+    captures. Only the aggregates and the last `window` entries of each kind
+    are kept in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None, offset: int = 0, window: int = DEFAULT_WINDOW):
+        self.path = path
+        self.offset = offset
+        self.format = "har" if path and path.endswith(".har") else "jsonl"
+        self.har_signature = None
+        self.requests = 0
+        self.request_errors = 0
+        self.url_stats: Dict[str, UrlStats] = {}
+        self.status_counts: Dict[int, int] = {}
+        self.durations = QuantileSketch()
+        self.level_counts: Dict[str, int] = {}
+        self.recent_requests = deque(maxlen=window)
+        self.recent_logs = deque(maxlen=window)
+
+    def ingest(self, entries: Iterable[Dict]) -> int:
+        """
+        Folds entries into the aggregates.
+
+        Args:
+            entries: Network request or console log dictionaries.
+
+        Returns:
+            The number of entries ingested.
+        """
+        ingested = 0
+        for entry in entries:
+            if "url" in entry:
+                self._add_request(entry)
+            elif "type" in entry or "level" in entry:
+                self._add_log(entry)
+            else:
+                continue
+            ingested += 1
+        return ingested
+
+    def _add_request(self, entry: Dict) -> None:
+        url = entry["url"]
+        status = entry.get("status")
+        stats = self.url_stats.get(url)
+        if stats is None:
+            stats = self.url_stats[url] = UrlStats()
+        stats.count += 1
+        self.requests += 1
+        if isinstance(status, int):
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if status >= 400:
+                stats.errors += 1
+                self.request_errors += 1
+        duration = entry.get("duration")
+        if isinstance(duration, (int, float)) and duration >= 0:
+            stats.durations.add(duration)
+            self.durations.add(duration)
+        self.recent_requests.append(entry)
+
+    def _add_log(self, entry: Dict) -> None:
+        level = entry.get("type", entry.get("level"))
+        self.level_counts[level] = self.level_counts.get(level, 0) + 1
+        self.recent_logs.append(entry)
+
+    def poll(self) -> int:
+        """
+        Reads and ingests whatever was appended to the source file since the last poll.
+
+        Returns:
+            The number of entries ingested.
+        """
+        if self.path is None:
+            return 0
+        if self.format == "har":
+            return self._poll_har()
+        if os.path.getsize(self.path) < self.offset:
+            # The file was truncated or rotated; start over from its beginning.
+            self.offset = 0
+        ingested = 0
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            pending = b""
+            while True:
+                block = file.read(READ_BLOCK_SIZE)
+                if not block:
+                    return ingested
+                record_bytes_read(len(block))
+                data = pending + block
+                end = data.rfind(b"\n") + 1
+                pending = data[end:]
+                if end == 0:
+                    continue
+                self.offset += end
+                ingested += self.ingest(self._parse_lines(data[:end]))
+
+    def _parse_lines(self, data: bytes) -> Iterable[Dict]:
+        for line in data.splitlines():
+            if line.strip():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                # Only objects are entries; stray scalars or arrays in the capture are skipped.
+                if isinstance(entry, dict):
+                    yield entry
+
+    def _poll_har(self) -> int:
+        # A HAR file is one JSON document, so any change means reading and parsing all of it again:
+        # each poll of a changed file costs O(file size), not O(new entries). Prefer JSONL for
+        # large or continuously growing captures. Unchanged files are skipped without being read.
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self.har_signature:
+            return 0
+        with open(self.path, "rb") as file:
+            data = file.read()
+        record_bytes_read(len(data))
+        har_entries = json.loads(data).get("log", {}).get("entries", [])
+        self.har_signature = signature
+        if len(har_entries) < self.offset:
+            # The capture was replaced with a shorter one; start over from its first entry.
+            self.offset = 0
+        new_entries = har_entries[self.offset:]
+        self.offset = len(har_entries)
+        return self.ingest(_from_har_entry(entry) for entry in new_entries)
+
+    def network_summary(self, top: int = 20) -> Dict:
+        """Returns request totals, latency quantiles, status counts and the busiest URLs."""
+        busiest = sorted(self.url_stats.items(), key=lambda item: item[1].count, reverse=True)[:top]
+        return {
+            "requests": self.requests,
+            "error_rate": self.request_errors / self.requests if self.requests else 0.0,
+            "p50": self.durations.quantile(0.50),
+            "p95": self.durations.quantile(0.95),
+            "p99": self.durations.quantile(0.99),
+            "status_counts": dict(sorted(self.status_counts.items())),
+            "urls": {url: stats.to_dict() for url, stats in busiest},
+        }
+
+    def console_summary(self) -> Dict:
+        """Returns the number of console entries per log level."""
+        return {"logs": sum(self.level_counts.values()), "level_counts": dict(self.level_counts)}
+
+    def window(self, kind: str, size: int) -> List[Dict]:
+        """Returns up to the last size entries of a kind ('network' or 'console')."""
+        recent = self.recent_requests if kind == "network" else self.recent_logs
+        if size <= 0:
+            return []
+        return list(recent)[-size:]
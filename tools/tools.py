@@ -1,22 +1,54 @@
 import ast
+import copy
 import os
 import re
 import unittest
 import logging
 import shutil
-from typing import Dict, List, Optional
+import time
+from typing import Dict, List, Optional, Tuple
 from tools.message import Message, MessageType, create_message
 from tools.memory import Memory
 from tools.logger import Logger, logger
-from tools.agent import Agent
-from tools.devtools import get_console_logs, get_network_requests, get_dom_structure, run_terminal_command as simulate_run_terminal_command
+from tools.devtools import get_console_logs, get_network_requests, get_dom_structure, get_dom_snapshot, run_terminal_command as simulate_run_terminal_command
 from tools.trigger import Trigger
+from tools.file_reader import clear_line_index_cache, get_line_index, read_bytes
+from tools.overlay import StagingOverlay
+from tools.symbols import SCRIPT_EXTENSIONS, SymbolTable
+from tools.telemetry import TelemetryIngester
+from tools import metrics
+from tools.metrics import instrument_tool, timed
 import uuid
 
 # Dictionary to store simulated approval responses (keyed by request ID)
 # In a real application, this would be managed by a UI and a backend system.
 simulated_approval_responses = {}
 
+# Approval requests sent to the UI and not yet resolved, keyed by request ID. A tool call
+# resuming with a request_id must match the action_type and details that were approved.
+# The issue time feeds the approval_wait metric when the response arrives.
+approval_requests: Dict[str, Dict] = {}
+
+# Proposed file changes held in memory until commit_staged_changes() flushes them to disk.
+# Tool reads go through this overlay so agents see their own uncommitted edits.
+staged_changes = StagingOverlay()
+
+# Definitions of every function and class seen so far, kept up to date as files are summarized or indexed.
+symbol_table = SymbolTable(reader=staged_changes.read)
+
+# The DOM snapshot returned by the last observe_application("dom", ...) call, used to report only what changed.
+last_dom_snapshot = None
+
+# Telemetry ingesters keyed by source file, so each observation only reads what was appended since the last one.
+telemetry_ingesters: Dict[str, TelemetryIngester] = {}
+
+# Summaries of unstaged files keyed by path, reused while the file's mtime and size are unchanged.
+_summary_cache: Dict[str, tuple] = {}
+
+# Upper bound on the content returned by one read_file call; larger files must be read in ranges.
+MAX_READ_BYTES = 10 * 1024 * 1024
+
+@instrument_tool
 def get_file_content_summary(path: str) -> Dict:
     """
     Generates a concise summary of the content of a file.
@@ -27,9 +59,18 @@ def get_file_content_summary(path: str) -> Dict:
     Returns:
         A dictionary containing a summary of the file.
     """
+    cache_key = None
+    if not staged_changes.is_staged(path):
+        try:
+            stat = os.stat(path)
+            cache_key = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+        cached = _summary_cache.get(path)
+        if cached is not None and cached[0] == cache_key:
+            return copy.deepcopy(cached[1])
     try:
-        with open(path, "r") as file:
-            content = file.read()
+        content = staged_changes.read(path)
     except FileNotFoundError:
         error_msg = f"File not found: {path}"
         logging.error(error_msg)
@@ -42,8 +83,13 @@ def get_file_content_summary(path: str) -> Dict:
     summary = {"path": path}
     try:
         if path.endswith((".py", ".js", ".ts", ".tsx")):
+            if path.endswith(SCRIPT_EXTENSIONS):
+                symbol_table.update_file(path, content)
             try:
-                tree = ast.parse(content)
+                with timed("ast_parse"):
+                    tree = ast.parse(content)
+                if path.endswith(".py"):
+                    symbol_table.update_file(path, content, tree)
                 summary = {
                     "type": "code",
                     "functions": [],
@@ -93,7 +139,10 @@ def get_file_content_summary(path: str) -> Dict:
                 "type": "unknown",
                 "content_preview": content[:200] + "..." if len(content) > 200 else content
             }
-        return {"path": path, "summary": summary, "status": "success"}
+        result = {"path": path, "summary": summary, "status": "success"}
+        if cache_key is not None:
+            _summary_cache[path] = (cache_key, copy.deepcopy(result))
+        return result
     
     except FileNotFoundError:
         return {"error": f"File not found: {path}"}
@@ -101,26 +150,56 @@ def get_file_content_summary(path: str) -> Dict:
         return {"error": f"Error processing file: {e}"}
 
 
-def natural_language_write_file(path: str, prompt: str) -> Dict:
+def _approval_response(approval_request: Dict, resume: bool) -> Optional[Dict]:
+    """
+    Returns the user's response to an approval request, or None if it has not been answered yet.
+
+    Tools never block waiting for a response. A new request is recorded in
+    approval_requests and sent to the UI, and the tool returns its request_id.
+    The caller repeats the call with that request_id after the response has
+    been sent with receive_approval_response. A resumed call must be for the
+    same action as the request that was issued; otherwise, or if the request
+    was never issued, an {"error": ...} dictionary is returned.
+    """
+    request_id = approval_request["request_id"]
+    if not resume:
+        approval_requests[request_id] = {
+            "action_type": approval_request["action_type"],
+            "details": approval_request["details"],
+            "issued_at": time.perf_counter(),
+        }
+        print(f"Approval request: {approval_request}") # Simulate sending to UI
+        return None
+    issued = approval_requests.get(request_id)
+    if issued is None:
+        return {"error": f"Unknown approval request: {request_id}"}
+    if issued["action_type"] != approval_request["action_type"] or issued["details"] != approval_request["details"]:
+        return {"error": f"Approval request {request_id} was issued for a different {issued['action_type']} action"}
+    response = simulated_approval_responses.pop(request_id, None)
+    if response is not None:
+        del approval_requests[request_id]
+    return response
+
+
+@instrument_tool
+def natural_language_write_file(path: str, prompt: str, request_id: Optional[str] = None) -> Dict:
     """
     Writes content to a file based on a natural language prompt.
     Args:
         path: The path to the file to write.
         prompt: The natural language instructions for the content to write.
+        request_id: The ID of an earlier approval request, to resume the write once it has been answered.
     Returns:
-        A dictionary indicating the status of the operation (staged, approval_required, or error).
+        A dictionary indicating the status of the operation (staged, approval_required, denied, or error).
         If staged or approval is required, includes the proposed content.
     """
-    # TODO: Implement real write permission checks here.
-    import time
-    # For now, we'll simulate needing approval for certain paths.
     # TODO: Implement real Git integration here to stage changes.
     # TODO: Implement real write permission checks here.
     # For now, we'll simulate needing approval for certain paths.
     requires_approval = False
     # Define a standard data structure for approval requests
     approval_request = {
-        "request_id": str(uuid.uuid4()),
+        "request_id": request_id or str(uuid.uuid4()),
         "action_type": "write_file",
         "details": {"path": path, "prompt": prompt},
     }
@@ -129,18 +208,22 @@ def natural_language_write_file(path: str, prompt: str) -> Dict:
 
     proposed_content = f"// Content based on prompt: {prompt}\n// AI-generated content goes here." # This would be generated by an LLM in a real scenario
 
-    # Simulate sending approval request to UI and waiting for response
     if requires_approval:
-        print(f"Approval request for writing to {path}: {approval_request}") # Simulate sending to UI
-        # Simulate waiting for approval response
-        while approval_request["request_id"] not in simulated_approval_responses:
-            time.sleep(1) # Simulate waiting
-
-        response = simulated_approval_responses.pop(approval_request["request_id"])
-
+        response = _approval_response(approval_request, resume=request_id is not None)
+        if response is None:
+            return {
+                "status": "approval_required",
+                "request_id": approval_request["request_id"],
+                "message": f"Writing to {path} requires user approval.",
+                "proposed_content": proposed_content,
+                "approval_request": approval_request,
+            }
+        if "error" in response:
+            return response
         if not response.get("approved", False):
             return {"status": "denied", "message": "User denied write access."}
-        # If approved, proceed with simulated staging
+        # If approved, stage the proposed content in the overlay
+        staged_changes.write(path, proposed_content)
         return {
             "status": "staged",
             "message": f"Changes for {path} staged for review. Requires prior approval.",
@@ -148,24 +231,27 @@ def natural_language_write_file(path: str, prompt: str) -> Dict:
             "approval_request": approval_request,
         }
 
-    # Simulate staging changes in version control
+    staged_changes.write(path, proposed_content)
     return {"status": "staged", "message": f"Changes for {path} staged for review.", "proposed_content": proposed_content}
 
-def run_terminal_command(command: str, require_approval: bool = True) -> Dict:
-    import time
-
+@instrument_tool
+def run_terminal_command(command: str, require_approval: bool = True, request_id: Optional[str] = None) -> Dict:
     """
-    Writes content to a file based on a natural language prompt.
+    Runs a terminal command, asking for approval first unless it is a known safe command.
+
     Args:
-        path: The path to the file to write.
-        prompt: The natural language instructions for the content to write.
+        command: The command line to run.
+        require_approval: Whether to ask for approval even for known safe commands.
+        request_id: The ID of an earlier approval request, to resume the command once it has been answered.
+
     Returns:
-        A dictionary indicating the status of the operation (staged, approval_required, or error).
-        If staged or approval is required, includes the proposed content.
-    # TODO: Implement real write permission checks here.
+        A dictionary with the command output, or the denial or error message.
+    """
+    # TODO: Implement real execute permission checks here.
+    requires_approval = False
     # Define a standard data structure for approval requests
     approval_request = {
-        "request_id": str(uuid.uuid4()),
+        "request_id": request_id or str(uuid.uuid4()),
         "action_type": "run_terminal_command",
         "details": {"command": command},
     }
@@ -178,13 +264,17 @@ def run_terminal_command(command: str, require_approval: bool = True) -> Dict:
         requires_approval = True
 
     if requires_approval:
-        print(f"Approval request for command '{command}': {approval_request}") # Simulate sending to UI
-        # Simulate waiting for approval response
-        while approval_request["request_id"] not in simulated_approval_responses:
-            time.sleep(1) # Simulate waiting
-
-        response = simulated_approval_responses.pop(approval_request["request_id"])
-
+        response = _approval_response(approval_request, resume=request_id is not None)
+        if response is None:
+            return {
+                "status": "pending_approval",
+                "request_id": approval_request["request_id"],
+                "command": command,
+                "message": f"Command '{command}' requires user approval.",
+                "approval_request": approval_request,
+            }
+        if "error" in response:
+            return response
         if not response.get("approved", False):
             return {"status": "denied", "message": "User denied command execution."}
         # If approved, proceed with command execution
@@ -193,12 +283,12 @@ def run_terminal_command(command: str, require_approval: bool = True) -> Dict:
             return {"status": "success", "output": output}
         except Exception as e:
             return {
-            "status": "error",
-            "error": str(e),
-            "command": command,
-            "message": f"Error executing command '{command}' after approval."
-            "approval_request": approval_request,
-        }
+                "status": "error",
+                "error": str(e),
+                "command": command,
+                "message": f"Error executing command '{command}' after approval.",
+                "approval_request": approval_request,
+            }
 
     # Simulate running the command (replace with actual subprocess execution in a real environment)
     try:
@@ -208,52 +298,54 @@ def run_terminal_command(command: str, require_approval: bool = True) -> Dict:
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
+@instrument_tool
 def run_static_analysis(file_path: str) -> Dict:
- """
+    """
     Simulates running a static code analysis tool on the specified file.
-    
- Args:
- file_path: The path to the file to analyze.
 
- Returns:
- A dictionary containing a list of simulated issues found.
- """
- # This is a simulation of a static analysis tool.
- # In a real implementation, you would integrate with tools like Pylint, ESLint, etc.
+    Args:
+        file_path: The path to the file to analyze.
+
+    Returns:
+        A dictionary containing a list of simulated issues found.
+    """
+    # This is a simulation of a static analysis tool.
+    # In a real implementation, you would integrate with tools like Pylint, ESLint, etc.
 
     simulated_issues = []
     if "example_error" in file_path:
         simulated_issues.append({
- "type": "error",
- "message": "Simulated syntax error found.",
- "line": 10
- })
+            "type": "error",
+            "message": "Simulated syntax error found.",
+            "line": 10
+        })
     if "example_warning" in file_path:
         simulated_issues.append({
- "type": "warning",
- "message": "Simulated unused variable.",
- "line": 5
- })
+            "type": "warning",
+            "message": "Simulated unused variable.",
+            "line": 5
+        })
 
     return {
- "status": "success",
- "file_path": file_path,
- "issues": simulated_issues
+        "status": "success",
+        "file_path": file_path,
+        "issues": simulated_issues
     }
 
 
+@instrument_tool
 def get_dependencies(file_path: str) -> Dict:
     """
     Simulates analyzing the specified file and identifying its dependencies.
 
     Args:
- file_path: The path to the file to analyze.
+        file_path: The path to the file to analyze.
 
- Returns:
- A dictionary listing the simulated dependencies.
- """
- # This is a simulation of dependency tracking.
- # In a real implementation, you would use static analysis or language-specific tools.
+    Returns:
+        A dictionary listing the simulated dependencies.
+    """
+    # This is a simulation of dependency tracking.
+    # In a real implementation, you would use static analysis or language-specific tools.
 
     simulated_deps = []
     if "file1.py" in file_path:
@@ -262,11 +354,12 @@ def get_dependencies(file_path: str) -> Dict:
         simulated_deps.append("mood_log_function")
 
     return {
- "status": "success",
- "file_path": file_path,
- "dependencies": simulated_deps
+        "status": "success",
+        "file_path": file_path,
+        "dependencies": simulated_deps
     }
 
+@instrument_tool
 def receive_approval_response(request_id: str, approved: bool) -> Dict:
     """
     Simulates receiving an approval response from an external UI.
@@ -276,18 +369,152 @@ def receive_approval_response(request_id: str, approved: bool) -> Dict:
         approved: A boolean indicating whether the request was approved.
 
     Returns:
-        A dictionary indicating the status of receiving the response.
+        A dictionary indicating the status of receiving the response, or an error
+        if no approval request with that ID is waiting for a response.
     """
+    issued = approval_requests.get(request_id)
+    if issued is None:
+        return {"error": f"Unknown approval request: {request_id}"}
+    metrics.observe("approval_wait", time.perf_counter() - issued["issued_at"])
     # Simulate the UI sending the response
     simulated_approval_responses[request_id] = {"approved": approved}
     return {"status": "success", "message": f"Received approval response for request ID: {request_id}"}
 
-def read_file(path: str) -> Dict:
- # TODO: Add more complex permission logic here later. For now, assume all project files are readable.
+@instrument_tool
+def read_file(
+    path: str,
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
+    start_byte: Optional[int] = None,
+    end_byte: Optional[int] = None,
+    max_bytes: int = MAX_READ_BYTES,
+) -> Dict:
+    """
+    Reads a file, or a line or byte range of it.
+
+    Line ranges are 1-based and inclusive and are served from a cached line
+    index, so repeated range reads on the same file do not rescan it. Ranges
+    are clamped to the file, so a range outside it reads nothing. A byte range
+    that splits a multi-byte character decodes it as U+FFFD.
+
+    Args:
+        path: The path to the file to read.
+        start_line: The first line to read. Enables a line-range read.
+        end_line: The last line to read (inclusive). Enables a line-range read.
+        start_byte: The first byte offset to read. Enables a byte-range read.
+        end_byte: The byte offset to stop at (exclusive). Enables a byte-range read.
+        max_bytes: The largest amount of content returned by a single call.
+
+    Returns:
+        A dictionary containing the content read, or an error message.
+    """
+    # TODO: Add more complex permission logic here later. For now, assume all project files are readable.
+    try:
+        if staged_changes.is_staged(path):
+            return _read_staged_file(path, start_line, end_line, start_byte, end_byte, max_bytes)
+        if start_line is not None or end_line is not None:
+            index = get_line_index(path)
+            first, last = _line_range(start_line, end_line, index.line_count)
+            start, end = index.byte_range(first, last)
+            result = {"start_line": first, "end_line": last, "total_lines": index.line_count}
+        else:
+            start, end = _clamp_range(start_byte, end_byte, 0, os.path.getsize(path))
+            result = {"start_byte": start, "end_byte": end}
+        if end - start > max_bytes:
+            return _read_limit_error(path, end - start, max_bytes)
+        result["content"] = read_bytes(path, start, end).decode("utf-8", errors="replace")
+        result["status"] = "success"
+        return result
+    except FileNotFoundError:
+        return {"error": f"File not found: {path}"}
+    except Exception as e:
+        error_msg = f"Error reading file: {path}, Error: {e}"
+        logging.error(error_msg)
+        return {"error": error_msg}
+
+def _clamp_range(start: Optional[int], end: Optional[int], lower: int, upper: int) -> Tuple[int, int]:
+    """
+    Resolves an optional half-open [start, end) range against the bounds [lower, upper).
+
+    A missing end defaults to its bound and out-of-range values are clamped,
+    so the result always satisfies lower <= start <= end <= upper.
+    """
+    start = lower if start is None else min(max(start, lower), upper)
+    end = upper if end is None else min(max(end, start), upper)
+    return start, end
+
+def _line_range(start_line: Optional[int], end_line: Optional[int], line_count: int) -> Tuple[int, int]:
+    """Resolves an optional 1-based inclusive line range; an empty range has end_line == start_line - 1."""
+    first, stop = _clamp_range(start_line, None if end_line is None else end_line + 1, 1, line_count + 1)
+    return first, stop - 1
+
+def _read_limit_error(path: str, size: int, max_bytes: int) -> Dict:
+    return {"error": f"Requested range of {path} is {size} bytes, exceeding the {max_bytes} byte limit. Read a smaller range."}
+
+def _read_staged_file(path: str, start_line: Optional[int], end_line: Optional[int],
+                      start_byte: Optional[int], end_byte: Optional[int], max_bytes: int) -> Dict:
+    if start_line is not None or end_line is not None:
+        lines = staged_changes.read_lines(path)
+        first, last = _line_range(start_line, end_line, len(lines))
+        data = "".join(lines[first - 1:last]).encode("utf-8")
+        result = {"start_line": first, "end_line": last, "total_lines": len(lines)}
+    else:
+        data = staged_changes.read(path).encode("utf-8")
+        start, end = _clamp_range(start_byte, end_byte, 0, len(data))
+        data = data[start:end]
+        result = {"start_byte": start, "end_byte": end}
+    if len(data) > max_bytes:
+        return _read_limit_error(path, len(data), max_bytes)
+    result.update({"content": data.decode("utf-8", errors="replace"), "status": "success", "staged": True})
+    return result
+
+@instrument_tool
+def commit_staged_changes() -> Dict:
+    """
+    Writes every staged file change to disk in one batch.
+
+    Returns:
+        A dictionary with the list of committed paths, and an error message if some or all could not be written.
+    """
     try:
-        return {"content": open(path, "r").read(), "status": "success"}
-    except FileNotFoundError: return {"error": f"File not found: {path}"}
+        result = staged_changes.commit()
+    except Exception as e:
+        result = {"status": "error", "error": f"Error committing staged changes: {e}", "committed": []}
+    if result["status"] == "error":
+        logging.error(result["error"])
+    if result["committed"]:
+        clear_line_index_cache()
+        _refresh_symbols(result["committed"])
+    return result
+
+@instrument_tool
+def discard_staged_changes(path: Optional[str] = None) -> Dict:
+    """
+    Drops staged file changes without writing them.
 
+    Args:
+        path: An optional path to discard. If None, all staged changes are discarded.
+
+    Returns:
+        A dictionary indicating the status of the operation.
+    """
+    discarded = staged_changes.staged_paths() if path is None else [os.path.normpath(path)]
+    staged_changes.discard(path)
+    _refresh_symbols(discarded)
+    return {"status": "success", "staged": staged_changes.staged_paths()}
+
+
+def _refresh_symbols(paths: List[str]) -> None:
+    # Symbols indexed from staged content are only valid while it is staged; re-read committed or discarded files from disk.
+    for path in paths:
+        if path not in symbol_table.file_symbols:
+            continue
+        try:
+            symbol_table.update_file(path)
+        except (OSError, UnicodeDecodeError):
+            symbol_table.remove_file(path)
+
+@instrument_tool
 def simulate_ui_approval(request_id: str, approved: bool) -> Dict:
     """
     Simulates an external UI sending an approval response.
@@ -302,6 +529,7 @@ def simulate_ui_approval(request_id: str, approved: bool) -> Dict:
     """
     return receive_approval_response(request_id, approved)
 
+@instrument_tool
 def find_code_usage(query: str, path: Optional[str] = None, logger: Logger = None) -> Dict:
     """
 
@@ -321,46 +549,183 @@ def find_code_usage(query: str, path: Optional[str] = None, logger: Logger = Non
     
     def search_in_file(filepath: str):
         try:
-            lines = []
-            with open(filepath, "r") as file:
-                lines = file.readlines()
+            lines = staged_changes.read_lines(filepath)
 
             for line_number, line in enumerate(lines):
                 if query in line:
-                    # Include a few lines of context
-                    context_lines = []
-                    for i in range(max(0, line_number - 2), min(len(lines), line_number + 3)):
-                        context_lines.append(f"{i + 1}: {lines[i].rstrip()}")
-                    results["usages"].append({
-                        "file": filepath,
-                        "line": line_number + 1,
-                        "context": "\n".join(context_lines),
-                    })
+                    results["usages"].append(_usage(filepath, lines, line_number))
         except Exception as e:
             results["usages"].append(
                 {"file": filepath, "error": f"Error processing file: {e}"}
             )
 
-    if path :
-        search_in_file(path)
-    else:
-        for root, _, files in os.walk("."):
-            for file in files:
-                if file.endswith((".py", ".ts", ".js", ".tsx")):
-                    filepath = os.path.join(root, file)
-                    search_in_file(filepath)
+    for filepath in _code_files(path):
+        search_in_file(filepath)
 
     return results
 
+
+@instrument_tool
+def find_code_usages(queries: List[str], path: Optional[str] = None, regex: bool = False, logger: Logger = None) -> Dict:
+    """
+    Searches for the usages of several code elements in a single pass over the project.
+
+    All queries are combined into one compiled pattern, so each file is read
+    and scanned once regardless of how many queries are given. Only lines
+    that match the combined pattern are checked against individual queries.
+    Regular expressions with groups are kept out of the combined pattern,
+    since joining them would renumber their groups and break backreferences.
+
+    Args:
+        queries: The code elements to search for (e.g., function names, class names).
+        path: An optional path to a specific file to search within. If None, searches the entire project.
+        regex: Whether the queries are regular expressions rather than literal strings.
+        logger: An optional Logger object for logging.
+
+    Returns:
+        A dictionary mapping each query to its results, in the same format as find_code_usage.
+    """
+    queries = list(dict.fromkeys(queries))
+    results = {"queries": queries, "results": {query: {"query": query, "usages": []} for query in queries}}
+    if not queries:
+        return results
+    try:
+        patterns = [re.compile(query if regex else re.escape(query)) for query in queries]
+    except re.error as e:
+        return {"error": f"Invalid search pattern: {e}"}
+    separate = [pattern for pattern in patterns if pattern.groups]
+    combinable = [pattern for pattern in patterns if not pattern.groups]
+    try:
+        if combinable:
+            separate.insert(0, re.compile("|".join(f"(?:{pattern.pattern})" for pattern in combinable)))
+    except re.error:
+        # Some valid patterns cannot be combined, e.g. ones with global inline flags such as "(?i)";
+        # fall back to trying each pattern in turn.
+        separate = patterns
+
+    def search(text: str) -> bool:
+        return any(pattern.search(text) for pattern in separate)
+
+    for filepath in _code_files(path):
+        try:
+            content = staged_changes.read(filepath)
+            if not search(content):
+                continue
+            lines = content.splitlines(keepends=True)
+            for line_number, line in enumerate(lines):
+                if not search(line):
+                    continue
+                for query, pattern in zip(queries, patterns):
+                    if pattern.search(line):
+                        results["results"][query]["usages"].append(_usage(filepath, lines, line_number))
+        except Exception as e:
+            for query in queries:
+                results["results"][query]["usages"].append(
+                    {"file": filepath, "error": f"Error processing file: {e}"}
+                )
+
+    return results
+
+
+@instrument_tool
+def index_symbols(path: str = ".") -> Dict:
+    """
+    Builds or refreshes the project symbol table. Files unchanged since they were last indexed are skipped.
+
+    Args:
+        path: The directory to index.
+
+    Returns:
+        A dictionary with the number of files indexed and skipped and the number of symbols known.
+    """
+    try:
+        result = symbol_table.index_project(path)
+    except Exception as e:
+        error_msg = f"Error indexing symbols in {path}: {e}"
+        logging.error(error_msg)
+        return {"error": error_msg}
+    result["status"] = "success"
+    return result
+
+
+@instrument_tool
+def find_definition(name: str) -> Dict:
+    """
+    Looks up where a function or class is defined, using the project symbol table.
+
+    Args:
+        name: The symbol name, or a qualified name such as "MyClass.method".
+
+    Returns:
+        A dictionary containing the definitions found, each with file, line, kind and signature.
+    """
+    if not symbol_table.project_indexed:
+        index_symbols()
+    return {"name": name, "definitions": symbol_table.find_definition(name), "status": "success"}
+
+
+@instrument_tool
+def search_symbols(query: str, fuzzy: bool = False, limit: int = 20) -> Dict:
+    """
+    Searches the project symbol table by name prefix, or approximately.
+
+    Args:
+        query: The name prefix, or the approximate name if fuzzy is True.
+        fuzzy: Whether to return close matches instead of prefix matches.
+        limit: The maximum number of names to return.
+
+    Returns:
+        A dictionary mapping each matching name to its definitions.
+    """
+    if not symbol_table.project_indexed:
+        index_symbols()
+    names = symbol_table.find_fuzzy(query, limit) if fuzzy else symbol_table.find_prefix(query, limit)
+    return {
+        "query": query,
+        "matches": {name: symbol_table.find_definition(name) for name in names},
+        "status": "success",
+    }
+
+
+def _code_files(path: Optional[str] = None):
+    """Yields the file to search, or every code file in the project (including staged-only files) if path is None."""
+    if path:
+        yield path
+        return
+    for root, _, files in os.walk("."):
+        for file in files:
+            if file.endswith((".py", ".ts", ".js", ".tsx")):
+                yield os.path.join(root, file)
+    # Files that so far only exist in the staging overlay
+    for filepath in staged_changes.staged_paths():
+        if filepath.endswith((".py", ".ts", ".js", ".tsx")) and not os.path.exists(filepath):
+            yield filepath
+
+
+def _usage(filepath: str, lines: List[str], line_number: int) -> Dict:
+    # Include a few lines of context
+    context_lines = []
+    for i in range(max(0, line_number - 2), min(len(lines), line_number + 3)):
+        context_lines.append(f"{i + 1}: {lines[i].rstrip()}")
+    return {
+        "file": filepath,
+        "line": line_number + 1,
+        "context": "\n".join(context_lines),
+    }
+
     
-def modify_code_structure(path: str, prompt: str, logger:Logger = None) -> Dict:
+@instrument_tool
+def modify_code_structure(path: str, prompt: str, logger:Logger = None, request_id: Optional[str] = None) -> Dict:
     """
     Modifies the code structure in a file based on a prompt.
 
+    The change is only staged once it has been approved.
+
     Args:
         path: The path to the file to modify.
         prompt: The instructions for how to modify the code structure.
         logger: An optional Logger object for logging.
+        request_id: The ID of an earlier approval request, to resume the change once it has been answered.
 
     Returns:
         A dictionary indicating the status of the operation (staged, approval_required, denied, or error).
@@ -368,18 +733,12 @@ def modify_code_structure(path: str, prompt: str, logger:Logger = None) -> Dict:
     """
     # Define a standard data structure for approval requests
     approval_request = {
-        "request_id": str(uuid.uuid4()),
-    Args:
-        path: The path to the file to modify.
-        prompt: The instructions for how to modify the code structure.
-
-    Returns:
-        A dictionary indicating the success or failure of the operation.
-    """
+        "request_id": request_id or str(uuid.uuid4()),
         "action_type": "modify_code_structure",
+        "details": {"path": path, "prompt": prompt},
+    }
     try:
-        with open(path, "r") as file:
-            content = file.readlines()
+        content = staged_changes.read_lines(path)
 
         if "move function" in prompt.lower():            
             match = re.search(
@@ -388,18 +747,15 @@ def modify_code_structure(path: str, prompt: str, logger:Logger = None) -> Dict:
 
             if match:
                 func_name, from_path, to_path = match.groups()
-                if not os.path.exists(os.path.dirname(to_path)):
-                    os.makedirs(os.path.dirname(to_path))
-                if not os.path.exists(from_path):
+                if not staged_changes.exists(from_path):
                     return {"error": f"File not found: {from_path}"}
-                if not os.path.exists(to_path):
+                if not staged_changes.exists(to_path):
                     return {"error": f"File not found: {to_path}"}
 
 
                 from_file_content:List[str] = []
                 try:
-                    with open(from_path, "r") as f:
-                        from_file_content = f.readlines()
+                    from_file_content = staged_changes.read_lines(from_path)
                 except Exception as e:
                     logging.error(f"Error reading file: {from_path}, Error: {e}")
                     return {"error": f"Error reading file: {from_path}, Error: {e}"}
@@ -422,37 +778,39 @@ def modify_code_structure(path: str, prompt: str, logger:Logger = None) -> Dict:
 
                 if not func_content:
                     return {"error": f"Function {func_name} not found in {from_path}"}
-                try:
-                    with open(to_path, "a") as f:
-                        f.writelines(func_content)
-                    new_from_file_content=[]
-                    for line in from_file_content[:]:
-                        if line not in func_content:
-                            new_from_file_content.append(line)
-                    with open(from_path, "w") as f:
-                        f.writelines(new_from_file_content)
-                    
-                    # Simulate needing approval for structural changes
-                    requires_approval = True
-                    if requires_approval:
-                        proposed_changes = {
-                            "type": "move_function",
-                            "details": {
-                                "function_name": func_name,
-                                "from_path": from_path,
-                                "to_path": to_path
-                            }
-                        }
-                        print(f"Approval request for modifying code structure: {approval_request}") # Simulate sending to UI
-                        while approval_request["request_id"] not in simulated_approval_responses:
-                            time.sleep(1) # Simulate waiting
+                new_from_file_content = [line for line in from_file_content if line not in func_content]
 
-                        response = simulated_approval_responses.pop(approval_request["request_id"])
-                        if not response.get("approved", False):
-                            return {"status": "denied", "message": "User denied code structure modification."}
+                # Simulate needing approval for structural changes
+                requires_approval = True
+                if requires_approval:
+                    proposed_changes = {
+                        "type": "move_function",
+                        "details": {
+                            "function_name": func_name,
+                            "from_path": from_path,
+                            "to_path": to_path
+                        }
+                    }
+                    response = _approval_response(approval_request, resume=request_id is not None)
+                    if response is None:
+                        return {
+                            "status": "approval_required",
+                            "request_id": approval_request["request_id"],
+                            "message": f"Moving function '{func_name}' requires user approval.",
+                            "proposed_changes": proposed_changes,
+                            "approval_request": approval_request,
+                        }
+                    if "error" in response:
+                        return response
+                    if not response.get("approved", False):
+                        return {"status": "denied", "message": "User denied code structure modification."}
+                try:
+                    staged_changes.append(to_path, "".join(func_content))
+                    staged_changes.write(from_path, "".join(new_from_file_content))
                     return {
                         "status": "success",
-                        "message": f"Moved function '{func_name}' from '{from_path}' to '{to_path}'",
+                        "message": f"Moved function '{func_name}' from '{from_path}' to '{to_path}' (staged)",
+                        "staged": [from_path, to_path],
                     }
                 except Exception as e:
                     logging.error(f"Error modifying files: {from_path} or {to_path}, Error: {e}")
@@ -464,21 +822,21 @@ def modify_code_structure(path: str, prompt: str, logger:Logger = None) -> Dict:
             if match:
                 to_path, function_concept = match.groups()                
                 
-                if not os.path.exists(path):
+                if not staged_changes.exists(path):
                     return {"error": f"File not found: {path}"}
 
                 
                 try:
                     from_file_content:List[str] = []
-                    with open(path, "r") as f:
-                        from_file_content = f.readlines()
+                    from_file_content = staged_changes.read_lines(path)
                 except Exception as e:
                     logging.error(f"Error reading file: {path}, Error: {e}")
                     return {"error": f"Error reading file: {path}, Error: {e}"}
                 
                 functions_to_move = []
                 try:
-                    tree = ast.parse("".join(from_file_content))
+                    with timed("ast_parse"):
+                        tree = ast.parse("".join(from_file_content))
                     for node in ast.walk(tree):
                         if isinstance(node, ast.FunctionDef):
                             if function_concept.lower() in node.name.lower():
@@ -487,38 +845,25 @@ def modify_code_structure(path: str, prompt: str, logger:Logger = None) -> Dict:
                     logging.error(f"Error parsing functions in file: {path}, Error: {e}")
                     return {"error": f"Error parsing functions in file: {path}, Error: {e}"}
                 
-                if not os.path.exists(os.path.dirname(to_path)):
-                    os.makedirs(os.path.dirname(to_path))
-                
-                try:
-                    with open(to_path, "w") as f:
-                        pass
-
-                    for func_name in functions_to_move:
-                        func_content = []
-                        in_function = False
-                        for line in from_file_content:
-                            if f"def {func_name}" in line or f"function {func_name}" in line or f"const {func_name}" in line:
-                                in_function = True
-                                func_content.append(line)
-                            elif in_function and (line.startswith("def ") or line.startswith("function ") or line.startswith("const ")):
-                                in_function = False
-                                break
-                            elif in_function:
-                                func_content.append(line)
-                        if not func_content:
-                            return {"error": f"Function {func_name} not found in {path}"}
-                        
-                        with open(to_path, "a") as f:
-                            f.writelines(func_content)
-                        from_file_content = [line for line in from_file_content if line not in func_content]
-                except Exception as e:
-                    logging.error(f"Error modifying files: {path} or {to_path}, Error: {e}")
-                    return {"status": "error", "error": f"Error modifying files: {path} or {to_path}, Error: {e}"}
-                
-                with open(path, "w") as f:
-                    f.writelines(from_file_content)
-                
+                moved_content = []
+                for func_name in functions_to_move:
+                    func_content = []
+                    in_function = False
+                    for line in from_file_content:
+                        if f"def {func_name}" in line or f"function {func_name}" in line or f"const {func_name}" in line:
+                            in_function = True
+                            func_content.append(line)
+                        elif in_function and (line.startswith("def ") or line.startswith("function ") or line.startswith("const ")):
+                            in_function = False
+                            break
+                        elif in_function:
+                            func_content.append(line)
+                    if not func_content:
+                        return {"error": f"Function {func_name} not found in {path}"}
+
+                    moved_content.extend(func_content)
+                    from_file_content = [line for line in from_file_content if line not in func_content]
+
                 # Simulate needing approval for structural changes
                 requires_approval = True
                 if requires_approval:
@@ -530,13 +875,31 @@ def modify_code_structure(path: str, prompt: str, logger:Logger = None) -> Dict:
                             "functions_moved": functions_to_move
                         }
                     }
-                    print(f"Approval request for modifying code structure: {approval_request}") # Simulate sending to UI
-                    while approval_request["request_id"] not in simulated_approval_responses:
-                        time.sleep(1) # Simulate waiting
+                    response = _approval_response(approval_request, resume=request_id is not None)
+                    if response is None:
+                        return {
+                            "status": "approval_required",
+                            "request_id": approval_request["request_id"],
+                            "message": f"Moving functions related to '{function_concept}' requires user approval.",
+                            "proposed_changes": proposed_changes,
+                            "approval_request": approval_request,
+                        }
+                    if "error" in response:
+                        return response
+                    if not response.get("approved", False):
+                        return {"status": "denied", "message": "User denied code structure modification."}
+
+                try:
+                    staged_changes.write(to_path, "".join(moved_content))
+                    staged_changes.write(path, "".join(from_file_content))
+                except Exception as e:
+                    logging.error(f"Error modifying files: {path} or {to_path}, Error: {e}")
+                    return {"status": "error", "error": f"Error modifying files: {path} or {to_path}, Error: {e}"}
 
                 return {
                     "status": "success",
-                    "message": f"Moved functions related to '{function_concept}' from '{path}' to '{to_path}'",
+                    "message": f"Moved functions related to '{function_concept}' from '{path}' to '{to_path}' (staged)",
+                    "staged": [path, to_path],
                 }
             else:           
                 return {"error": "Invalid move function prompt format."}
@@ -547,30 +910,119 @@ def modify_code_structure(path: str, prompt: str, logger:Logger = None) -> Dict:
     except Exception as e:
         return {"error": f"Error modifying code: {e}"}
 
+@instrument_tool
 def use_llm(prompt: str, logger: Logger = None) -> Dict:
     return {"response": f"Response for: {prompt}"}
 
 
-def observe_application(target: str) -> Dict:
+@instrument_tool
+def observe_application(target: str, selector: Optional[str] = None, since_last: bool = False,
+                        snapshot_path: Optional[str] = None, source: Optional[str] = None,
+                        summary: bool = False, window: Optional[int] = None) -> Dict:
     """
     Observes the running application using simulated DevTools.
 
     Args:
-        target: The specific aspect to observe ('console', 'network', 'dom').
+        target: The specific aspect to observe ('console', 'network', 'dom', 'metrics').
+        selector: For 'dom', a simple CSS selector; only the matching nodes are returned.
+        since_last: For 'dom', return only the structural diff against the previous DOM observation.
+        snapshot_path: For 'dom', a JSON file holding a saved DOM tree to observe instead of the simulated one.
+        source: For 'console' and 'network', a JSONL or HAR file to tail instead of the simulated data.
+        summary: For 'console' and 'network', return rolling aggregates instead of raw entries.
+        window: For 'console' and 'network', return only the most recent `window` entries.
 
     Returns:
         A dictionary containing the observation data or an error message.
     """
+    if target == 'metrics':
+        return {"metrics": metrics.registry.snapshot(), "status": "success"}
+    if target in ('console', 'network') and (source is not None or summary or window is not None):
+        return _observe_telemetry(target, source, summary, window)
     if target == 'console':
         return get_console_logs()
     elif target == 'network':
         return get_network_requests()
     elif target == 'dom':
-        return get_dom_structure()
+        if selector is None and not since_last and snapshot_path is None:
+            return get_dom_structure()
+        return _observe_dom(selector, since_last, snapshot_path)
     else:
         return {"error": f"Unknown observation target: {target}"}
 
 
+@instrument_tool
+def export_metrics(path: str) -> Dict:
+    """
+    Writes a JSON snapshot of the collected tool metrics.
+
+    Args:
+        path: The path of the JSON file to write.
+
+    Returns:
+        A dictionary indicating the status of the operation.
+    """
+    try:
+        metrics.registry.export_json(path)
+    except Exception as e:
+        error_msg = f"Error exporting metrics to {path}: {e}"
+        logging.error(error_msg)
+        return {"error": error_msg}
+    return {"status": "success", "path": path}
+
+
+def _observe_telemetry(target: str, source: Optional[str], summary: bool, window: Optional[int]) -> Dict:
+    if source is None:
+        ingester = TelemetryIngester()
+        ingester.ingest(get_console_logs()["console_logs"] + get_network_requests()["network_requests"])
+    else:
+        ingester = telemetry_ingesters.get(source)
+        if ingester is None:
+            ingester = telemetry_ingesters[source] = TelemetryIngester(source)
+        try:
+            ingester.poll()
+        except FileNotFoundError:
+            return {"error": f"File not found: {source}"}
+        except Exception as e:
+            error_msg = f"Error reading telemetry from {source}: {e}"
+            logging.error(error_msg)
+            return {"error": error_msg}
+
+    result = {"status": "success"}
+    if summary or window is None:
+        if target == 'network':
+            result["network_summary"] = ingester.network_summary()
+        else:
+            result["console_summary"] = ingester.console_summary()
+    if window is not None:
+        key = "network_requests" if target == 'network' else "console_logs"
+        result[key] = ingester.window(target, window)
+    return result
+
+
+def _observe_dom(selector: Optional[str], since_last: bool, snapshot_path: Optional[str]) -> Dict:
+    global last_dom_snapshot
+    try:
+        snapshot = get_dom_snapshot(snapshot_path)
+    except FileNotFoundError:
+        return {"error": f"File not found: {snapshot_path}"}
+    except Exception as e:
+        error_msg = f"Error loading DOM snapshot: {e}"
+        logging.error(error_msg)
+        return {"error": error_msg}
+    previous, last_dom_snapshot = last_dom_snapshot, snapshot
+
+    result = {"status": "success", "node_count": len(snapshot)}
+    if selector is not None:
+        try:
+            result["dom_nodes"] = snapshot.query(selector)
+        except ValueError as e:
+            return {"error": str(e)}
+    if since_last:
+        if previous is None:
+            result["dom_diff"] = {"added": [snapshot.node(index) for index in range(len(snapshot))], "removed": [], "changed": []}
+        else:
+            result["dom_diff"] = previous.diff(snapshot)
+    return result
 
 
 class TestTools(unittest.TestCase):
@@ -596,6 +1048,8 @@ class TestTools(unittest.TestCase):
 
     def tearDown(self):
         # Clean up dummy files (optional)
+        staged_changes.discard()
+        symbol_table.remove_file("test_dir")
         shutil.rmtree("test_dir")
         if os.path.exists("test_dir/mood"):
              shutil.rmtree("test_dir/mood")
@@ -603,6 +1057,7 @@ class TestTools(unittest.TestCase):
             with open("test_dir/file2.txt", "w") as f:
                 f.write("This is a test text file.")
     def test_agent(self):
+        from tools.agent import Agent
         memory = Memory()
         agent = Agent("Test Agent", memory, logger, [])
         message = Message("Test Sender", "Test Agent", MessageType.OBSERVATION, {"content": "Test message"})
@@ -638,20 +1093,59 @@ class TestTools(unittest.TestCase):
         self.assertTrue(len(find_code_usage("test_function5", path="test_dir/file5.js", logger=logger)["usages"]) > 0)
         self.assertEqual(len(find_code_usage("nonexistent", logger=logger)["usages"]), 0)
 
+    def test_find_code_usages(self):
+        result = find_code_usages(["test_function2", "mood_log", "nonexistent"], path="test_dir/file3.py")
+        self.assertTrue(len(result["results"]["test_function2"]["usages"]) > 0)
+        self.assertEqual(len(result["results"]["mood_log"]["usages"]), 2)
+        self.assertEqual(len(result["results"]["nonexistent"]["usages"]), 0)
+        self.assertTrue(len(find_code_usages(["test_function2", "mood_log"])["results"]["test_function2"]["usages"]) > 0)
+        result = find_code_usages(["(?i)MOOD_LOG_FUNCTION", "process"], path="test_dir/file3.py", regex=True)
+        self.assertEqual(result["results"]["(?i)MOOD_LOG_FUNCTION"]["usages"][0]["line"], 4)
+        self.assertEqual(len(result["results"]["process"]["usages"]), 1)
+        # Backreferences still refer to their own pattern's groups.
+        result = find_code_usages([r"(x)\1", r"(l)\1", "process"], path="test_dir/file3.py", regex=True)
+        self.assertEqual([usage["line"] for usage in result["results"][r"(l)\1"]["usages"]], [2])
+        self.assertEqual(len(result["results"]["process"]["usages"]), 1)
+        result = find_code_usages([r"test_function\d"], path="test_dir/file5.js", regex=True)
+        self.assertEqual(result["results"][r"test_function\d"]["usages"][0]["line"], 1)
+        self.assertIn("error", find_code_usages(["("], regex=True))
+
+    def test_symbol_lookup(self):
+        # Summarising a file indexes only that file, which must not count as a project index.
+        table = SymbolTable()
+        table.update_file("test_dir/file1.py")
+        self.assertFalse(table.project_indexed)
+        table.index_project("test_dir")
+        self.assertTrue(table.project_indexed)
+        self.assertEqual(table.find_definition("test_function4")[0]["file"], os.path.join("test_dir", "file4.ts"))
+        index_symbols("test_dir")
+        definitions = find_definition("mood_log_function")["definitions"]
+        self.assertEqual(definitions[0]["file"], os.path.join("test_dir", "file3.py"))
+        self.assertEqual(definitions[0]["line"], 4)
+        self.assertEqual(find_definition("test_function4")["definitions"][0]["kind"], "function")
+        self.assertIn("MyClass", search_symbols("My")["matches"])
+        self.assertIn("test_function5", search_symbols("test_functoin5", fuzzy=True)["matches"])
+
     def test_modify_code_structure(self):
         logger = Logger()
+        prompt = "move function test_function from test_dir/file1.py to test_dir/file2.txt"
+        pending = modify_code_structure("test_dir/file1.py", prompt, logger=logger)
+        self.assertEqual(pending["status"], "approval_required")
+        self.assertEqual(staged_changes.staged_paths(), [])
+        receive_approval_response(pending["request_id"], True)
         self.assertEqual(
-            modify_code_structure(
-                "test_dir/file1.py",
-                "move function test_function from test_dir/file1.py to test_dir/file2.txt",
-                logger=logger
-            )["status"], "success"            
+            modify_code_structure("test_dir/file1.py", prompt, logger=logger, request_id=pending["request_id"])["status"],
+            "success"
         )
+        prompt = "create a new file named test_dir/mood/mood.py and move all functions related to mood log there"
+        pending = modify_code_structure("test_dir/file3.py", prompt)
+        receive_approval_response(pending["request_id"], False)
+        self.assertEqual(modify_code_structure("test_dir/file3.py", prompt, request_id=pending["request_id"])["status"], "denied")
+        pending = modify_code_structure("test_dir/file3.py", prompt)
+        receive_approval_response(pending["request_id"], True)
         self.assertEqual(
-            modify_code_structure(
-                "test_dir/file3.py",
-                "create a new file named test_dir/mood/mood.py and move all functions related to mood log there",
-            )["status"], "success"
+            modify_code_structure("test_dir/file3.py", prompt, request_id=pending["request_id"])["status"],
+            "success"
         )
         self.assertIn("error", modify_code_structure("test_dir/file3.py", "move function test_function from test_dir/file1.py to nonexistent.txt", logger=logger))
         self.assertIn("error", modify_code_structure("test_dir/file3.py", "invalid move prompt", logger=logger))
@@ -665,6 +1159,81 @@ class TestTools(unittest.TestCase):
         self.assertEqual(observe_application("dom")["status"], "success")
         self.assertIn("tag", observe_application("dom")["dom"])
 
+    def test_observe_application_dom_snapshot(self):
+        result = observe_application("dom", selector="div.main > header")
+        self.assertEqual(result["dom_nodes"][0]["classes"], ["app-header"])
+        self.assertEqual(len(observe_application("dom", selector="#welcome-message")["dom_nodes"]), 1)
+        with open("test_dir/dom.json", "w") as f:
+            f.write('{"tag": "body", "children": [{"tag": "p", "id": "welcome-message", "text": "Hi"}]}')
+        diff = observe_application("dom", since_last=True, snapshot_path="test_dir/dom.json")["dom_diff"]
+        self.assertEqual(len(diff["changed"]), 0)
+        self.assertEqual(len(diff["removed"]), 5)
+        self.assertEqual(diff["added"][0]["id"], "welcome-message")
+        self.assertIn("error", observe_application("dom", selector="a[href]"))
+        # Siblings sharing an id are told apart by their occurrence, so none of them is lost from the diff.
+        with open("test_dir/dom.json", "w") as f:
+            f.write('{"tag": "ul", "children": [{"tag": "li", "id": "item", "text": "a"}, {"tag": "li", "id": "item", "text": "b"}]}')
+        observe_application("dom", snapshot_path="test_dir/dom.json")
+        with open("test_dir/dom.json", "w") as f:
+            f.write('{"tag": "ul", "children": [{"tag": "li", "id": "item", "text": "a"}]}')
+        diff = observe_application("dom", since_last=True, snapshot_path="test_dir/dom.json")["dom_diff"]
+        self.assertEqual((len(diff["added"]), len(diff["changed"])), (0, 0))
+        self.assertEqual(diff["removed"][0]["text"], "b")
+
+    def test_observe_application_telemetry(self):
+        network = observe_application("network", summary=True)["network_summary"]
+        self.assertEqual(network["requests"], 3)
+        self.assertEqual(network["status_counts"][404], 1)
+        self.assertEqual(observe_application("console", summary=True)["console_summary"]["level_counts"]["error"], 1)
+        with open("test_dir/network.jsonl", "w") as f:
+            f.write('{"url": "/api/a", "method": "GET", "status": 200, "duration": 100}\n')
+            f.write('{"url": "/api/a", "method": "GET", "status": 500, "duration": 300}\n')
+        self.assertEqual(observe_application("network", source="test_dir/network.jsonl")["network_summary"]["urls"]["/api/a"]["error_rate"], 0.5)
+        with open("test_dir/network.jsonl", "a") as f:
+            f.write('{"url": "/api/b", "method": "GET", "status": 200, "duration": 50}\n')
+        result = observe_application("network", source="test_dir/network.jsonl", window=1)
+        self.assertEqual(result["network_requests"], [{"url": "/api/b", "method": "GET", "status": 200, "duration": 50}])
+        self.assertEqual(telemetry_ingesters["test_dir/network.jsonl"].requests, 3)
+        with open("test_dir/network.jsonl", "a") as f:
+            f.write('5\n[1, 2]\n{"url": "/api/b", "method": "GET", "status": 200, "duration": 70}\n')
+        observe_application("network", source="test_dir/network.jsonl")
+        self.assertEqual(telemetry_ingesters["test_dir/network.jsonl"].requests, 4)
+        telemetry_ingesters.clear()
+        with open("test_dir/network.har", "w") as f:
+            f.write('{"log": {"entries": [{"request": {"url": "/api/c", "method": "GET"}, "response": {"status": 200}, "time": 10}]}}')
+        ingester = TelemetryIngester("test_dir/network.har")
+        self.assertEqual(ingester.poll(), 1)
+        metrics.registry.enable()
+        metrics.registry.reset()
+        try:
+            # An unchanged HAR file is not read again.
+            self.assertEqual(ingester.poll(), 0)
+            self.assertEqual(metrics.registry.bytes_read, 0)
+        finally:
+            metrics.registry.disable()
+            metrics.registry.reset()
+
+    def test_observe_application_metrics(self):
+        metrics.registry.enable()
+        metrics.registry.reset()
+        try:
+            read_file("test_dir/file2.txt")
+            get_file_content_summary("test_dir/file1.py")
+            snapshot = observe_application("metrics")["metrics"]
+            self.assertEqual(snapshot["metrics"]["tool.read_file"]["calls"], 1)
+            self.assertEqual(snapshot["metrics"]["tool.read_file"]["bytes_read"], 25)
+            self.assertEqual(snapshot["metrics"]["ast_parse"]["calls"], 1)
+            self.assertEqual(snapshot["metrics"]["tool.read_file"]["errors"], 0)
+            read_file("test_dir/nonexistent.txt")
+            self.assertEqual(metrics.registry.snapshot()["metrics"]["tool.read_file"]["errors"], 1)
+            pending = run_terminal_command("rm -rf build")
+            receive_approval_response(pending["request_id"], True)
+            self.assertEqual(metrics.registry.snapshot()["metrics"]["approval_wait"]["calls"], 1)
+            self.assertEqual(export_metrics("test_dir/metrics.json")["status"], "success")
+        finally:
+            metrics.registry.disable()
+            metrics.registry.reset()
+
     def test_observe_application_errors(self):
         result = observe_application("invalid_target", memory=Memory()) # Added memory for consistency
         self.assertIn("error", result)
@@ -675,6 +1244,51 @@ class TestTools(unittest.TestCase):
         result_success = natural_language_write_file("test_dir/new_file.txt", "Write some text here.")
         self.assertEqual(result_success["status"], "success")
 
+    def test_staged_changes(self):
+        staged_changes.write("test_dir/file3.py", "def staged_only():\n    pass\n")
+        get_file_content_summary("test_dir/file3.py")
+        self.assertEqual(len(symbol_table.find_definition("staged_only")), 1)
+        discard_staged_changes("test_dir/file3.py")
+        self.assertEqual(symbol_table.find_definition("staged_only"), [])
+        self.assertEqual(len(symbol_table.find_definition("mood_log_function")), 1)
+        natural_language_write_file("test_dir/new_file.txt", "Write some text here.")
+        self.assertFalse(os.path.exists("test_dir/new_file.txt"))
+        self.assertTrue(read_file("test_dir/new_file.txt")["staged"])
+        self.assertEqual(commit_staged_changes()["committed"], ["test_dir/new_file.txt"])
+        self.assertTrue(os.path.exists("test_dir/new_file.txt"))
+        self.assertEqual(staged_changes.staged_paths(), [])
+        # A target that cannot be replaced fails the whole batch and leaves no temporary files behind.
+        os.makedirs("test_dir/subdir")
+        staged_changes.write("test_dir/subdir", "not a directory")
+        staged_changes.write("test_dir/other.txt", "other")
+        result = commit_staged_changes()
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(result["committed"], [])
+        self.assertEqual(staged_changes.staged_paths(), ["test_dir/other.txt", "test_dir/subdir"])
+        self.assertFalse(os.path.exists("test_dir/other.txt"))
+        self.assertEqual([name for name in os.listdir("test_dir") if name.endswith(".tmp")], [])
+
+    def test_read_file(self):
+        self.assertEqual(read_file("test_dir/file3.py")["status"], "success")
+        result = read_file("test_dir/file3.py", start_line=4, end_line=5)
+        self.assertEqual(result["content"], "def mood_log_function():\n   print('Mood log')\n")
+        self.assertEqual(read_file("test_dir/file2.txt", start_byte=0, end_byte=4)["content"], "This")
+        self.assertIn("error", read_file("test_dir/file2.txt", max_bytes=4))
+        self.assertIn("error", read_file("test_dir/nonexistent.txt"))
+        with open("test_dir/unicode.txt", "w", encoding="utf-8") as f:
+            f.write("caf\u00e9\nna\u00efve\n")
+        # Disk and staged reads resolve ranges the same way and limit the encoded size.
+        for staged in (False, True):
+            if staged:
+                staged_changes.write("test_dir/unicode.txt", "caf\u00e9\nna\u00efve\n")
+            self.assertEqual(read_file("test_dir/unicode.txt", start_line=-3, end_line=1)["content"], "caf\u00e9\n")
+            result = read_file("test_dir/unicode.txt", start_line=1, end_line=0)
+            self.assertEqual((result["content"], result["end_line"]), ("", 0))
+            self.assertEqual(read_file("test_dir/unicode.txt", start_line=9)["content"], "")
+            self.assertEqual(read_file("test_dir/unicode.txt", start_byte=-2, end_byte=4)["content"], "caf\ufffd")
+            self.assertEqual(read_file("test_dir/unicode.txt", start_byte=8, end_byte=2)["content"], "")
+            self.assertIn("error", read_file("test_dir/unicode.txt", end_line=1, max_bytes=4))
+
     def test_get_dependencies(self):
         # Test a file with simulated dependencies
         result = get_dependencies("test_dir/file1.py")
@@ -699,6 +1313,19 @@ class TestTools(unittest.TestCase):
         # Test a command that should require approval
         result_approval = run_terminal_command("rm -rf /")
         self.assertEqual(result_approval["status"], "pending_approval")
+        simulate_ui_approval(result_approval["request_id"], True)
+        result_approved = run_terminal_command("rm -rf /", request_id=result_approval["request_id"])
+        self.assertEqual(result_approved["status"], "success")
+
+        # Approvals only resume the action they were issued for
+        self.assertIn("error", run_terminal_command("rm -rf /", request_id="made-up-id"))
+        self.assertIn("error", receive_approval_response("made-up-id", True))
+        pending = run_terminal_command("rm -rf build")
+        simulate_ui_approval(pending["request_id"], True)
+        self.assertIn("error", run_terminal_command("rm -rf /", request_id=pending["request_id"]))
+        self.assertIn("error", modify_code_structure("test_dir/file1.py", "rm -rf build", request_id=pending["request_id"]))
+        self.assertEqual(run_terminal_command("rm -rf build", request_id=pending["request_id"])["status"], "success")
+        self.assertIn("error", run_terminal_command("rm -rf build", request_id=pending["request_id"]))
 
         # Test an allowed command that doesn't require explicit approval
         result_success = run_terminal_command("ls", require_approval=False)
@@ -1,3 +1,6 @@
+from tools.metrics import instrument
+
+
 class Trigger:
     def __init__(self):
         self.triggers = {}
@@ -18,6 +21,7 @@ class Trigger:
             raise ValueError("Action must be a callable function.")
         self.triggers[trigger_id]["actions"].append(action)
 
+    @instrument("trigger.execute_trigger")
     def execute_trigger(self, event: str, data: dict = None):
         for trigger_id, trigger_data in self.triggers.items():
             if trigger_data["event"] == event: